@@ -1,15 +1,8 @@
+from contextlib import closing
+
 import streamlit as st
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from io import StringIO
-import re
-import time
-from datetime import datetime, timedelta
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-import plotly.express as px
-import os
+# 로그인 화면은 streamlit + metrics 만으로 그림. 나머지(pandas/pyarrow/lxml/plotly 등)는 로그인 뒤에 불러옴
+from metrics import metrics
 
 # ---------------------------------------------------------
 # [설정] 페이지 기본 설정
@@ -118,11 +111,19 @@ def check_password():
             if submit_btn:
                 try:
                     correct_password = st.secrets["FAMILY_PASSWORD"]
-                except:
+                except Exception as e:
+                    metrics.swallowed('login', e)
                     correct_password = "1234"
+                # 관리자 PIN 은 secrets 에 따로 설정한 경우에만 사용 (운영 지표 패널 표시)
+                try:
+                    admin_password = st.secrets["ADMIN_PASSWORD"]
+                except Exception as e:
+                    metrics.swallowed('login', e)
+                    admin_password = None
 
-                if password == correct_password:
+                if password == correct_password or (admin_password and password == admin_password):
                     st.session_state["authenticated"] = True
+                    st.session_state["is_admin"] = bool(admin_password) and password == admin_password
                     st.rerun()
                 else:
                     st.error("비밀번호가 올바르지 않습니다.")
@@ -131,146 +132,145 @@ def check_password():
 if not check_password():
     st.stop()
 
+# ---------------------------------------------------------
+# [모듈] 로그인한 뒤에만 필요한 모듈 (plotly 는 차트를 그리는 탭에서 처음 쓸 때 불러옴)
+# ---------------------------------------------------------
+import pandas as pd
+import requests
+from store import SnapshotStore, FundamentalsCache, PriceStore, now_kst, trading_day
+from market_data import (SCAN_WORKERS, SNAPSHOT_KEY,
+                         stream_market_data, concat_frames, load_daily_history)
+from warmer import CacheWarmer
+from screener import DEFAULTS, Screener, SignalCache, stream_screen, result_table, diff_results
+from signals import SIGNAL_COLUMNS, MA_SIDES, signal_mask
+from backtest import REBALANCE, WEIGHTINGS, Backtest, load_history, summarize
+
 # ---------------------------------------------------------
 # [함수] 데이터 수집 및 처리
 # ---------------------------------------------------------
-@st.cache_data(ttl=3600)
-def get_naver_market_data():
-    progress_text = "전체 시장 데이터를 스캔하고 있습니다..."
+def st_progress(progress_text):
+    """market_data 함수에 넘길 progress 콜백과 진행바"""
     my_bar = st.progress(0, text=progress_text)
-    
-    session = requests.Session()
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    
-    url_submit = "https://finance.naver.com/sise/field_submit.naver"
-    form_data = {
-        'menu': 'market_sum',
-        'returnUrl': 'http://finance.naver.com/sise/sise_market_sum.naver',
-        'fieldIds': ['quant', 'amount', 'market_sum', 'per', 'roe', 'pbr', 'dividend_yield', 'operating_profit', 'frgn_rate']
-    }
-    session.post(url_submit, data=form_data, headers=headers)
-    
-    base_url = "https://finance.naver.com/sise/sise_market_sum.naver?sosok=0&page={}"
-    total_df = pd.DataFrame()
-    
-    for page in range(1, 45):
-        percent_complete = page / 45
-        my_bar.progress(percent_complete, text=f"{progress_text} ({int(percent_complete*100)}%)")
-        
-        try:
-            res = session.get(base_url.format(page), headers=headers)
-            html_table = StringIO(res.content.decode('euc-kr', 'replace'))
-            dfs = pd.read_html(html_table, header=0)
-            
-            if len(dfs) < 2: break
-            df = dfs[1]
-            if df.dropna(how='all').empty: break
-            
-            soup = BeautifulSoup(res.text, 'html.parser')
-            links = soup.select('table.type_2 tr td a.tltle')
-            codes = [link['href'].split('=')[-1] for link in links]
-            
-            df = df[df['종목명'].notnull()].copy()
-            if len(df) != len(codes): continue
-            
-            df['Ticker'] = codes
-            total_df = pd.concat([total_df, df])
-        except: break
+    def update(fraction, label):
+        my_bar.progress(fraction, text=f"{progress_text} ({label})")
+    return my_bar, update
 
-    my_bar.empty()
-    
-    if total_df.empty: return pd.DataFrame()
-
-    total_df = total_df.set_index('Ticker')
-    cols_map = {
-        '종목명': 'Name', '현재가': '종가', '전일비': '전일비', '등락률': '등락률',
-        '시가총액': '시가총액', '거래량': '거래량', '거래대금': '거래대금',
-        'PER': 'PER', 'ROE': 'ROE', 'PBR': 'PBR', '배당수익률': 'DIV',
-        '영업이익': '영업이익', '외국인비율': '외국인비율'
-    }
-    current_cols = [c for c in cols_map.keys() if c in total_df.columns]
-    df_final = total_df[current_cols].rename(columns=cols_map)
-    
-    def parse_change(value):
-        if pd.isna(value): return 0
-        s_val = str(value).strip().replace(',', '')
-        try: return float(re.sub(r'[^0-9.-]', '', s_val))
-        except: return 0.0
-
-    df_final['전일비'] = df_final['전일비'].apply(parse_change)
-    numeric_cols = ['종가', '시가총액', '거래량', '거래대금', 'PER', 'ROE', 'PBR', 'DIV', '영업이익', '외국인비율']
-    for col in numeric_cols:
-        if col in df_final.columns:
-            df_final[col] = pd.to_numeric(df_final[col], errors='coerce').fillna(0)
-            
-    df_final['시가총액'] *= 100000000 
-    df_final['거래대금'] *= 1000000
-    df_final['영업이익'] *= 100000000
-    
-    return df_final
+@st.cache_resource
+def get_snapshot_store():
+    # 장중에는 30분까지, 장 마감 후에는 다음 장 시작 전까지 디스크 스냅샷을 재사용
+    return SnapshotStore(max_age_minutes=30)
 
-def add_debt_ratio(candidate_df):
-    if candidate_df.empty: return candidate_df
-    debt_ratios = []
-    
-    progress_text = "재무제표 정밀 분석 중..."
-    my_bar = st.progress(0, text=progress_text)
-    
-    for i, ticker in enumerate(candidate_df.index):
-        my_bar.progress((i + 1) / len(candidate_df), text=f"{progress_text} ({candidate_df.iloc[i]['Name']})")
-        try:
-            url = f"https://finance.naver.com/item/main.naver?code={ticker}"
-            res = requests.get(url, headers={'User-Agent': 'Mozilla/5.0'})
-            dfs = pd.read_html(StringIO(res.text))
-            
-            found = False
-            for df in dfs:
-                if df.shape[1] > 1 and '부채비율' in df.iloc[:, 0].astype(str).values:
-                    row = df[df.iloc[:, 0] == '부채비율'].iloc[0]
-                    vals = pd.to_numeric(row[1:], errors='coerce').dropna()
-                    if not vals.empty:
-                        debt_ratios.append(vals.iloc[-1])
-                        found = True
-                        break
-            if not found: debt_ratios.append(9999.0)
-            time.sleep(0.02) 
-        except: debt_ratios.append(9999.0)
-
-    my_bar.empty()
-    candidate_df['부채비율'] = debt_ratios
-    return candidate_df
-
-@st.cache_data
+@st.cache_resource
+def get_fundamentals_cache():
+    return FundamentalsCache()
+
+@st.cache_resource
+def get_price_store():
+    return PriceStore()
+
+@st.cache_resource
+def get_cache_warmer():
+    # 프로세스당 하나만 뜨는 백그라운드 갱신 스레드
+    return CacheWarmer(get_snapshot_store(), get_fundamentals_cache(), get_price_store()).start()
+
+@st.cache_data(ttl=600)
 def get_detailed_daily_data(ticker, days=1825):
-    url_sise = "https://finance.naver.com/item/sise_day.naver"
-    price_list = []
-    target_date = datetime.now() - timedelta(days=days)
-    page = 1
-    
-    while True:
+    return load_daily_history(ticker, get_price_store(), days)
+
+@st.cache_resource(max_entries=1)
+def get_history(taken_at):
+    # 새 스냅샷이 저장될 때(taken_at)마다 쌓인 일별 스냅샷 전체를 다시 읽음
+    return load_history(get_snapshot_store())
+
+@st.cache_resource(max_entries=3)
+def get_backtest(taken_at, rebalance):
+    panels, names = get_history(taken_at)
+    if not panels or len(panels['종가']) < 2: return None
+    debt = get_fundamentals_cache().get_many(panels['종가'].columns)['부채비율']
+    return Backtest(panels, names, debt, rebalance)
+
+@st.cache_resource
+def get_signal_cache():
+    # 기술적 지표는 스냅샷이 아니라 일별 시세로 계산하므로 검색 엔진이 새로 만들어져도 같은 거래일 동안 유지
+    return SignalCache()
+
+@st.cache_resource(max_entries=2)
+def get_screener(taken_at, path):
+    # 스냅샷(찍은 시각)마다 하나. 파일은 캐시에 없을 때만 읽고, 이미 받아 둔 부채비율과 계산해 둔 지표로 시작
+    df_all = get_snapshot_store().read(path)
+    cached = get_fundamentals_cache().get_many(df_all.index)
+    return Screener(df_all, cached['부채비율'], signal_cache=get_signal_cache())
+
+@st.cache_resource(max_entries=1)
+def get_previous_screener(taken_at):
+    """taken_at 스냅샷 전 거래일의 스냅샷으로 만든 검색 엔진 -> (찍은 시각, Screener). 없으면 (None, None)"""
+    df_prev, prev_at = get_snapshot_store().load_previous(SNAPSHOT_KEY, taken_at)
+    if df_prev is None: return None, None
+    # 그날 스냅샷에 함께 저장된 부채비율이 있으면 그 값, 없으면 지금 캐시에 있는 값 (이전 결과 때문에 새로 받지는 않음)
+    debt = get_fundamentals_cache().get_many(df_prev.index)['부채비율']
+    if '부채비율' in df_prev: debt = df_prev['부채비율'].dropna().combine_first(debt)
+    return prev_at, Screener(df_prev, debt)
+
+@st.cache_data(max_entries=100)
+def get_price_chart(ticker, name, day, _drawn=None):
+    """종목/거래일 별로 그림을 캐시 (day 는 캐시 키로만 사용).
+    캐시에 없어 새로 그렸으면 _drawn(캐시 키에서 빠짐)에 표시 - 적중/누락은 부르는 쪽에서 셈"""
+    from charts import with_moving_averages, price_figure
+    if _drawn is not None: _drawn.append(ticker)
+    df_chart = with_moving_averages(get_detailed_daily_data(ticker))
+    if df_chart.empty: return None, None, None
+    with metrics.timer('chart', 'render'):
+        return price_figure(df_chart, name), df_chart['Close'].iloc[-1], df_chart['MA240'].iloc[-1]
+
+def load_screener():
+    """-> (찍은 시각, 검색 엔진). 이 세션의 스캔이 일부 페이지를 받지 못해 스냅샷으로 저장되지 않았으면 그 결과로,
+    아니면 마지막 스냅샷(유효기간이 지났더라도)으로 만듦 (네트워크 요청 없음). 둘 다 없으면 (None, None)"""
+    store = get_snapshot_store()
+    partial = st.session_state.get('partial_scan')
+    if partial is not None:
+        scanned_at, _, screener = partial
+        latest_at, _ = store.latest(SNAPSHOT_KEY)
+        # 그 뒤에 온전한 스냅샷이 저장됐으면(백그라운드 갱신 등) 그쪽을 씀
+        if latest_at is None or latest_at < scanned_at: return scanned_at, screener
+        del st.session_state['partial_scan']
+    # 슬라이더 재실행마다 파일을 읽지 않도록 찍은 시각만 확인 (검색 엔진이 캐시에 없을 때만 읽음)
+    for _ in range(2):
+        taken_at, path = store.latest(SNAPSHOT_KEY)
+        if path is None: break
         try:
-            res = requests.get(url_sise, headers={'User-Agent': 'Mozilla/5.0'}, params={'code': ticker, 'page': page})
-            dfs = pd.read_html(StringIO(res.text))
-            if len(dfs) < 1: break
-            df = dfs[0].dropna()
-            if df.empty: break
-            
-            stop_flag = False
-            for _, row in df.iterrows():
-                dt = datetime.strptime(row['날짜'], "%Y.%m.%d")
-                if dt < target_date:
-                    stop_flag = True; break
-                price_list.append({'Date': dt, 'Close': int(row['종가'])})
-            
-            if stop_flag or page > 400: break
-            page += 1
-            time.sleep(0.01)
-        except: break
-            
-    df_price = pd.DataFrame(price_list)
-    if not df_price.empty:
-        df_price = df_price.set_index('Date').sort_index()
-    return df_price
+            return taken_at, get_screener(taken_at, path)
+        except (OSError, ValueError) as e:   # 읽기 직전에 같은 날 새 스냅샷이 저장되면서 지워짐 -> 새 스냅샷으로 한 번 더
+            metrics.swallowed('screen', e)
+    return None, None
+
+def render_metrics_panel():
+    """관리자 전용: 요청 수/지연/캐시 적중률/삼킨 예외"""
+    snap = metrics.snapshot()
+    with st.expander("🛠️ 운영 지표 (관리자)", expanded=False):
+        st.caption(f"프로세스 가동 {snap['uptime_s'] / 60:.0f}분")
+        if snap['stages']:
+            df_stages = pd.DataFrame([
+                {'단계': stage, '요청': v['requests'], '오류': v['http_errors'], '재시도': v['retries'],
+                 '병합': v['coalesced'], 'KB': v['bytes'] // 1024,
+                 '평균(ms)': v['latency_avg_s'] * 1000, 'p95(s)≤': v['latency_p95_s'],
+                 '적중률': v['cache_hit_rate'],
+                 '파싱(s)': v['timings'].get('parse', {}).get('total_s', 0.0)}
+                for stage, v in snap['stages'].items()
+            ])
+            st.dataframe(df_stages, hide_index=True, use_container_width=True)
+        if snap['exceptions']:
+            st.dataframe(pd.DataFrame(snap['exceptions']), hide_index=True, use_container_width=True)
+        c1, c2 = st.columns(2)
+        c1.download_button("JSON", metrics.to_json(), file_name='metrics.json', mime='application/json')
+        c2.download_button("Prometheus", metrics.to_prometheus(), file_name='metrics.prom', mime='text/plain')
+
+def describe_freshness():
+    """사이드바에 보여줄 데이터 기준 시각"""
+    taken_at, _ = get_snapshot_store().latest(SNAPSHOT_KEY)
+    if taken_at is None: return "아직 수집된 시세가 없습니다. (백그라운드에서 수집 중)"
+    minutes = int((now_kst() - taken_at).total_seconds() // 60)
+    age = f"{minutes}분 전" if minutes < 60 else f"{minutes // 60}시간 전" if minutes < 1440 else f"{minutes // 1440}일 전"
+    return f"📅 시세 기준: {taken_at:%m/%d %H:%M} ({age})"
 
 # =========================================================
 # [UI - 사이드바]
@@ -280,30 +280,38 @@ with st.sidebar:
     st.markdown("원하는 조건으로 주식을 찾아보세요.")
     
     with st.expander("기본 조건 (Valuation)", expanded=True):
-        in_max_per = st.slider("최대 PER (주가수익비율)", 0.0, 50.0, 10.0, step=0.5, help="낮을수록 저평가")
-        in_max_pbr = st.slider("최대 PBR (주가순자산비율)", 0.0, 5.0, 1.0, step=0.1, help="1 미만이면 자산가치보다 쌈")
-        in_min_roe = st.slider("최소 ROE (자기자본이익률)", 0.0, 30.0, 10.0, help="높을수록 돈을 잘 범")
+        in_max_per = st.slider("최대 PER (주가수익비율)", 0.0, 50.0, DEFAULTS['max_per'], step=0.5, help="낮을수록 저평가")
+        in_max_pbr = st.slider("최대 PBR (주가순자산비율)", 0.0, 5.0, DEFAULTS['max_pbr'], step=0.1, help="1 미만이면 자산가치보다 쌈")
+        in_min_roe = st.slider("최소 ROE (자기자본이익률)", 0.0, 30.0, DEFAULTS['min_roe'], help="높을수록 돈을 잘 범")
 
     with st.expander("재무 안정성 & 수급", expanded=False):
-        in_max_debt = st.slider("최대 부채비율 (%)", 0.0, 500.0, 200.0, step=10.0)
-        in_min_foreign = st.slider("최소 외국인 지분율 (%)", 0.0, 50.0, 5.0, step=1.0)
-        in_min_amt = st.number_input("최소 거래대금 (억원)", value=3, step=1) * 100000000
+        in_max_debt = st.slider("최대 부채비율 (%)", 0.0, 500.0, DEFAULTS['max_debt'], step=10.0)
+        in_min_foreign = st.slider("최소 외국인 지분율 (%)", 0.0, 50.0, DEFAULTS['min_foreign'], step=1.0)
+        in_min_amt = st.number_input("최소 거래대금 (억원)", value=DEFAULTS['min_amt'] // 100000000, step=1) * 100000000
 
     with st.expander("제외할 업종/키워드", expanded=False):
-        default_exclude = '은행|HDC|페인트|코리안리|지주|홀딩스|금융|증권|카드|공사|한국전력|한전KPS|강원랜드|자산|보험|레저|스팩|리츠|생명|해상|화재|시멘트'
-        in_exclude = st.text_area("제외 키워드 ( '|' 로 구분)", value=default_exclude, height=100)
+        in_exclude = st.text_area("제외 키워드 ( '|' 로 구분)", value=DEFAULTS['exclude'], height=100)
+
+    with st.expander("기술적 지표 (이동평균)", expanded=False):
+        in_ma_side = st.radio("현재가 위치", MA_SIDES, horizontal=True, help="240일선(약 1년 평균) 아래면 1년 평균보다 싸게 거래 중")
+        in_min_drawdown = st.slider("52주 고점 대비 최소 하락률 (%)", 0.0, 80.0, 0.0, step=5.0, help="0 이면 조건 없음")
+        in_max_vol = st.slider("최대 변동성 (연율 %)", 10.0, 150.0, 150.0, step=5.0, help="150 이면 조건 없음")
+    # 기술적 조건이 모두 '조건 없음'이면 일별 시세를 받지도, 지표로 거르지도 않음
+    use_signals = in_ma_side != MA_SIDES[0] or in_min_drawdown > 0 or in_max_vol < 150
 
     st.markdown("---")
     run_btn = st.button("🚀 조건에 맞는 종목 찾기", type="primary", use_container_width=True)
     st.caption("버튼을 누르면 분석이 시작됩니다.")
+    st.caption(describe_freshness())
+    if st.session_state.get("is_admin"):
+        render_metrics_panel()
 
 # =========================================================
 # [메인 화면]
 # =========================================================
 st.title("💎 저평가 주식 종목")
 
-if 'result_df' not in st.session_state:
-    st.session_state['result_df'] = pd.DataFrame()
+# 결과 DataFrame 은 세션에 두지 않고, 실행할 때마다 공유 스냅샷(검색 엔진)에서 필요한 만큼만 만듦
 if 'analysis_done' not in st.session_state:
     st.session_state['analysis_done'] = False
 
@@ -352,51 +360,105 @@ if not st.session_state['analysis_done']:
     st.error("⚠️ **투자 유의사항:** 이 프로그램은 과거 데이터를 기반으로 종목을 1차 필터링해주는 도구입니다. 최종 투자는 뉴스와 공시를 확인 후 신중하게 결정하세요.")
 
 # 2. 분석 실행 버튼 클릭 시 로직 (수정됨: 에러 처리 추가)
-if run_btn:
-    with st.spinner("데이터를 수집하고 분석 중입니다..."):
-        df_all = get_naver_market_data()
+params = dict(max_per=in_max_per, max_pbr=in_max_pbr, min_roe=in_min_roe,
+              min_foreign=in_min_foreign, min_amt=in_min_amt, exclude=in_exclude)
 
+# 스캔 도중 조건을 바꾸면 Streamlit 이 스크립트를 중단하고 다시 실행함. 이때 진행 중이던 생성기가 닫히면서
+# 남은 요청은 취소되고, scan_pending 이 남아 있으므로 바뀐 조건으로 처음부터 다시 스캔
+if run_btn or st.session_state.get('scan_pending'):
+    st.session_state['scan_pending'] = True
+    st.session_state['analysis_done'] = False
+    scan_bar, scan_update = st_progress("전체 시장 데이터를 스캔하고 있습니다...")
+    debt_bar, debt_update = st_progress("재무제표 정밀 분석 중...")
+    live_title, live_table = st.empty(), st.empty()
+
+    # 페이지 -> 1차 필터 -> 부채비율 확인을 거친 종목이 확인되는 대로 표에 추가됨
+    found, scanned, failed, scan_error = [], [], {}, None
+    def keep_scanned(frames):
+        # 빠진 페이지가 있어 스냅샷으로 저장되지 않더라도 이번에 받은 종목으로 결과를 만들 수 있도록 보관
+        for df in frames:
+            scanned.append(df)
+            yield df
+    stream = stream_screen(keep_scanned(stream_market_data(get_snapshot_store(), SCAN_WORKERS, scan_update, failed)),
+                           get_fundamentals_cache(), in_max_debt, **params, progress=debt_update)
+    try:
+        with closing(stream):
+            for df_found in stream:
+                found.append(df_found)
+                df_live = pd.concat(found).sort_values(by='시가총액', ascending=False)
+                live_title.markdown(f"### ⏳ 분석 중... 지금까지 {len(df_live)}개 종목 발견")
+                live_table.dataframe(result_table(df_live), use_container_width=True, hide_index=True)
+    except requests.RequestException as e:
+        # 재시도 끝에도 네이버가 응답하지 않음 (필드 설정 요청 등) -> 아래의 안내 메시지로
+        metrics.swallowed('market_scan', e)
+        scan_error = e
+    except Exception:
+        # 조건을 바꿔 중단된 경우(Streamlit 의 재실행 예외는 Exception 이 아님)가 아니면 다음 조작 때 같은 스캔을 되풀이하지 않음
+        st.session_state['scan_pending'] = False
+        raise
+    scan_bar.empty()
+    debt_bar.empty()
+    st.session_state['scan_pending'] = False
+
+    st.session_state.pop('partial_scan', None)
+    if failed and scanned and not scan_error:
+        # 이전 스냅샷(며칠 전일 수도 있음)으로 바꾸지 않고, 이 세션에서는 방금 받은 종목만으로 보여 줌
+        df_scan = concat_frames(scanned)
+        cached = get_fundamentals_cache().get_many(df_scan.index)
+        st.session_state['partial_scan'] = (now_kst(), sum(map(len, failed.values())),
+                                            Screener(df_scan, cached['부채비율'], signal_cache=get_signal_cache()))
+    _, screener = (None, None) if scan_error else load_screener()
     # [수정됨] 데이터 수집 실패 시 안전장치 (KeyError 방지)
-    if df_all.empty:
+    if screener is None:
         st.error("❌ 데이터를 가져오지 못했습니다. (네이버 금융 접속 차단 또는 네트워크 오류)")
         st.warning("팁: 1~2분 정도 기다렸다가 다시 시도해보세요. 너무 자주 누르면 차단될 수 있습니다.")
         st.stop()
 
     try:
-        # 2. 1차 필터링
-        cond_cap = df_all['시가총액'] >= 400000000000 
-        cond_amt = df_all['거래대금'] >= in_min_amt
-        cond_pbr = (df_all['PBR'] <= in_max_pbr) & (df_all['PBR'] > 0)
-        cond_per = (df_all['PER'] <= in_max_per) & (df_all['PER'] > 0)
-        cond_roe = df_all['ROE'] >= in_min_roe
-        cond_op = df_all['영업이익'] > 0 
-        cond_frgn = df_all['외국인비율'] >= in_min_foreign
-        cond_nm = ~df_all['Name'].str.contains(in_exclude)
-
-        df_candidates = df_all[cond_cap & cond_amt & cond_pbr & cond_per & cond_roe & cond_op & cond_frgn & cond_nm].copy()
-        
-        # 3. 2차 필터링 (부채비율)
-        if not df_candidates.empty:
-            df_candidates = add_debt_ratio(df_candidates)
-            cond_debt = df_candidates['부채비율'] <= in_max_debt
-            df_final = df_candidates[cond_debt].copy().sort_values(by='시가총액', ascending=False)
-            
-            st.session_state['result_df'] = df_final
-            st.session_state['analysis_done'] = True
-            st.rerun() 
-        else:
-            st.session_state['result_df'] = pd.DataFrame()
-            st.session_state['analysis_done'] = True
-            st.warning("조건을 만족하는 종목이 없습니다. 필터를 완화해보세요.")
+        # 스트리밍 중에 받은 부채비율을 검색 엔진에도 반영 (이미 캐시에 있으므로 새 요청은 거의 없음)
+        screener.fetch_missing_debt(get_fundamentals_cache(), **params)
+        if use_signals:
+            # 1차 후보 전체의 지표를 이때 한 번만 계산 (이후 슬라이더 재실행은 계산해 둔 값만 읽음)
+            signal_bar, signal_update = st_progress("이동평균선을 분석하고 있습니다...")
+            screener.fetch_missing_signals(get_price_store(), screener.candidates(**params).index, signal_update)
+            signal_bar.empty()
+        st.session_state['analysis_done'] = True
+        st.rerun()
             
     except KeyError as e:
         st.error(f"데이터 처리 중 오류가 발생했습니다: {e}")
         st.info("데이터가 올바르게 수집되지 않았습니다. 잠시 후 다시 시도해주세요.")
         st.stop()
 
-# 3. 분석 후 화면
-if st.session_state['analysis_done'] and not st.session_state['result_df'].empty:
-    df_res = st.session_state['result_df']
+# 3. 분석 후 화면 - 슬라이더를 움직이면 받아 둔 데이터로 바로 다시 계산 (버튼 불필요)
+df_res = pd.DataFrame()
+if st.session_state['analysis_done']:
+    taken_at, screener = load_screener()
+    if screener is not None:
+        partial = st.session_state.get('partial_scan')
+        if partial is not None and partial[2] is screener:
+            st.warning(f"⚠️ 이번 스캔에서 {partial[1]}개 페이지를 받지 못해 일부 종목이 빠졌을 수 있습니다. "
+                       "받은 종목만으로 보여 주며, 스냅샷으로는 저장하지 않았습니다.")
+        elif not get_snapshot_store().is_fresh(taken_at):
+            st.caption(f"ℹ️ {taken_at:%m/%d %H:%M} 에 저장한 이전 스냅샷 기준 결과입니다. 버튼을 누르면 새로 스캔합니다.")
+        rows = screener.screen_rows(**params, max_debt=in_max_debt)
+        df_res = screener.frame(rows)
+        n_no_signals = 0
+        if use_signals and not df_res.empty:
+            # 버튼을 눌렀을 때 계산해 둔 지표로만 거름 (아직 계산하지 않은 종목은 NaN 이라 빠짐)
+            n_no_signals = len(screener.missing_signals(df_res.index))
+            keep = signal_mask(df_res.reindex(columns=SIGNAL_COLUMNS), in_ma_side, in_min_drawdown,
+                               float('inf') if in_max_vol >= 150 else in_max_vol)
+            df_res = df_res[keep]
+        n_missing = len(screener.missing_debt(screener.candidates(**params).index))
+        if n_missing:
+            st.caption(f"ℹ️ 재무 정보를 아직 받지 않은 {n_missing}개 종목은 빠져 있습니다. 버튼을 누르면 함께 분석합니다.")
+        if n_no_signals:
+            st.caption(f"ℹ️ 기술적 지표를 아직 계산하지 않은 {n_no_signals}개 종목은 빠져 있습니다. 버튼을 누르면 함께 분석합니다.")
+    if df_res.empty:
+        st.warning("조건을 만족하는 종목이 없습니다. 필터를 완화해보세요.")
+
+if st.session_state['analysis_done'] and not df_res.empty:
     st.markdown(f"### 🎯 분석 결과: 총 {len(df_res)}개 종목 발견")
     m1, m2, m3, m4 = st.columns(4)
     m1.metric("발굴된 종목 수", f"{len(df_res)}개")
@@ -405,18 +467,11 @@ if st.session_state['analysis_done'] and not st.session_state['result_df'].empty
     m4.metric("평균 ROE", f"{df_res['ROE'].mean():.2f}%")
     st.markdown("---")
 
-    tab1, tab2, tab3 = st.tabs(["📊 종목 리스트", "🗺️ 시장 지도 (TreeMap)", "📉 상세 차트 분석"])
+    tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 종목 리스트", "🗺️ 시장 지도 (TreeMap)", "📉 상세 차트 분석", "🧪 백테스트", "🆕 지난 스캔 대비"])
 
     with tab1:
         st.subheader("📋 선별된 종목 목록")
-        df_disp = df_res.copy()
-        df_disp['시가총액'] = df_disp['시가총액'] / 100000000 
-        df_disp['거래대금'] = df_disp['거래대금'] / 100000000 
-        df_disp['영업이익'] = df_disp['영업이익'] / 100000000 
-        df_disp = df_disp.round(2)
-        cols_show = ['Name', '종가', '등락률', '시가총액', 'PER', 'ROE', 'PBR', '부채비율', '외국인비율']
-        df_disp = df_disp[cols_show]
-        df_disp.columns = ['종목명', '현재가', '등락률', '시총(억)', 'PER', 'ROE', 'PBR', '부채(%)', '외인(%)']
+        df_disp = result_table(df_res)
         st.dataframe(df_disp, use_container_width=True, hide_index=True)
         csv = df_disp.to_csv(index=False).encode('utf-8-sig')
         st.download_button(label="💾 엑셀(CSV)로 다운로드", data=csv, file_name='저평가_우량주_리스트.csv', mime='text/csv')
@@ -424,18 +479,14 @@ if st.session_state['analysis_done'] and not st.session_state['result_df'].empty
     with tab2:
         st.subheader("🗺️ 한눈에 보는 시장 지도")
         st.caption("박스 크기: 시가총액 / 색상: 등락률 (빨강:상승, 파랑:하락)")
-        def clean_rate_v2(x):
-            try:
-                if pd.isna(x) or x == '': return 0.0
-                s_val = str(x).strip().replace('%', '').replace('+', '')
-                return float(s_val)
-            except: return 0.0
-        df_res['CleanRate'] = df_res['등락률'].apply(clean_rate_v2).fillna(0.0)
-        max_val = max(abs(df_res['CleanRate'].min()), abs(df_res['CleanRate'].max()), 1.0)
+        import plotly.express as px
+        # 등락률은 스냅샷을 불러올 때 이미 숫자로 바뀌어 있음
+        df_map = df_res[['Name', '시가총액', '등락률', '종가', 'PER', 'PBR']].astype({'등락률': 'float64', 'PER': 'float64', 'PBR': 'float64'}).round(2)
+        max_val = max(abs(df_map['등락률'].min()), abs(df_map['등락률'].max()), 1.0)
         fig_map = px.treemap(
-            df_res, path=[px.Constant("전체"), 'Name'], values='시가총액', color='CleanRate',
+            df_map, path=[px.Constant("전체"), 'Name'], values='시가총액', color='등락률',
             color_continuous_scale='RdBu_r', range_color=[-max_val, max_val],
-            custom_data=['종가', 'PER', 'PBR', 'CleanRate']
+            custom_data=['종가', 'PER', 'PBR', '등락률']
         )
         fig_map.data[0].texttemplate = "<b>%{label}</b><br>%{customdata[3]:.2f}%"
         fig_map.update_traces(hovertemplate="<b>%{label}</b><br>등락률: %{customdata[3]:.2f}%<br>PER: %{customdata[1]} / PBR: %{customdata[2]}")
@@ -452,27 +503,82 @@ if st.session_state['analysis_done'] and not st.session_state['result_df'].empty
             code = selected_ticker.split('(')[-1].replace(')', '')
             name = selected_ticker.split(' (')[0]
             with st.spinner(f"'{name}' 데이터 로딩 중..."):
-                df_chart = get_detailed_daily_data(code)
-                if not df_chart.empty:
-                    font_path = 'NanumGothic.ttf'
-                    if not os.path.exists(font_path):
-                        url = 'https://github.com/google/fonts/raw/main/ofl/nanumgothic/NanumGothic-Regular.ttf'
-                        with open(font_path, 'wb') as f: f.write(requests.get(url).content)
-                    fm.fontManager.addfont(font_path)
-                    font_prop = fm.FontProperties(fname=font_path)
-                    plt.rc('font', family=font_prop.get_name())
-                    plt.rcParams['axes.unicode_minus'] = False
-                    fig, ax = plt.subplots(figsize=(12, 6))
-                    ax.plot(df_chart.index, df_chart['Close'], color='black', alpha=0.6, label='주가')
-                    ma120 = df_chart['Close'].rolling(120).mean()
-                    ma240 = df_chart['Close'].rolling(240).mean()
-                    ax.plot(df_chart.index, ma120, 'g--', label='120일선', linewidth=1.5)
-                    ax.plot(df_chart.index, ma240, 'r--', label='240일선', linewidth=1.5)
-                    ax.set_title(f"{name} 주가 추이 (5년)", fontsize=15)
-                    ax.legend()
-                    ax.grid(True, alpha=0.3)
-                    st.pyplot(fig, use_container_width=True)
-                    curr_price = df_chart['Close'].iloc[-1]
-                    ma240_val = ma240.iloc[-1]
+                drawn = []
+                fig, curr_price, ma240_val = get_price_chart(code, name, trading_day(), drawn)
+                # 캐시에 있으면 함수 본문이 실행되지 않으므로 적중은 여기서만 셀 수 있음
+                metrics.cache('chart', hits=0 if drawn else 1, misses=1 if drawn else 0)
+                if fig is not None:
+                    st.plotly_chart(fig, use_container_width=True)
                     if curr_price < ma240_val: st.success("✅ 현재 주가가 240일 장기 이동평균선 아래에 있습니다. (저점 매수 기회 가능성)")
                     else: st.info("ℹ️ 현재 주가가 240일 이동평균선 위에 있습니다. (추세 상승 중)")
+
+    with tab4:
+        st.subheader("🧪 지금 조건으로 예전부터 샀다면?")
+        st.caption("매일 장 마감 후 저장한 시장 스냅샷에 사이드바 조건(기술적 지표 제외)을 리밸런싱 날짜마다 다시 적용합니다. "
+                   "부채비율 기록이 없는 날은 현재 값을 사용하므로 참고용으로만 보세요.")
+        c1, c2 = st.columns(2)
+        in_rebalance = c1.selectbox("리밸런싱 주기", list(REBALANCE), index=2)
+        in_weighting = WEIGHTINGS[c2.radio("비중", list(WEIGHTINGS), horizontal=True)]
+        bt = get_backtest(get_snapshot_store().latest(SNAPSHOT_KEY)[0], REBALANCE[in_rebalance])
+        if bt is None:
+            st.info("백테스트에는 이틀 이상 쌓인 스냅샷이 필요합니다. 앱이 켜져 있는 동안 매일 장 마감 후 한 장씩 저장됩니다.")
+        else:
+            from charts import equity_figure
+            equity, held = bt.run(**params, max_debt=in_max_debt, weighting=in_weighting)
+            stats = summarize(equity)
+            b1, b2, b3, b4 = st.columns(4)
+            b1.metric("누적 수익률", f"{stats['총수익률']:.1f}%")
+            b2.metric("연 수익률", f"{stats['연수익률']:.1f}%")
+            b3.metric("최대 낙폭", f"{stats['최대낙폭']:.1f}%")
+            b4.metric("평균 보유 종목", f"{held.mean():.1f}개")
+            curves = {'현재 조건': equity, '시총 4,000억↑ 흑자 전체': bt.benchmark(in_weighting)}
+            st.plotly_chart(equity_figure(curves, f"{equity.index[0]:%Y.%m.%d} ~ {equity.index[-1]:%Y.%m.%d}"),
+                            use_container_width=True)
+
+            with st.expander("🔬 조건 조합 비교", expanded=False):
+                st.caption("선택한 값의 모든 조합을 한 번에 계산합니다. 나머지 조건은 사이드바 값을 그대로 씁니다.")
+                g1, g2, g3 = st.columns(3)
+                grid = {
+                    'max_per': g1.multiselect("PER 상한", sorted({5.0, 10.0, 15.0, 20.0, in_max_per}), default=[in_max_per]),
+                    'max_pbr': g2.multiselect("PBR 상한", sorted({0.5, 1.0, 1.5, 2.0, in_max_pbr}), default=[in_max_pbr]),
+                    'min_roe': g3.multiselect("ROE 하한", sorted({0.0, 5.0, 10.0, 15.0, in_min_roe}), default=[in_min_roe]),
+                }
+                if all(grid.values()):
+                    fixed = dict(params, max_debt=in_max_debt)
+                    df_grid = bt.sweep(grid, fixed, in_weighting).sort_values('연수익률', ascending=False)
+                    df_grid.columns = ['PER 상한', 'PBR 상한', 'ROE 하한', '총수익률(%)', '연수익률(%)', '최대낙폭(%)', '연변동성(%)', '평균 종목수']
+                    st.dataframe(df_grid.round(2), use_container_width=True, hide_index=True)
+
+    with tab5:
+        st.subheader("🆕 지난 스캔 이후 달라진 종목")
+        prev_at, prev_screener = get_previous_screener(get_snapshot_store().latest(SNAPSHOT_KEY)[0])
+        if prev_screener is None:
+            st.info("비교할 이전 거래일 스냅샷이 없습니다. 앱이 켜져 있는 동안 매일 장 마감 후 한 장씩 저장됩니다.")
+        else:
+            st.caption(f"{prev_at:%m/%d %H:%M} 스냅샷에 지금 조건(기술적 지표 제외)을 그대로 적용한 결과와 종목코드 기준으로 비교합니다. "
+                       "부채비율은 분기마다 한 번 받아 두므로, 다시 스캔해도 새로 들어온 종목만 재무 정보를 새로 받습니다.")
+            # 이전 스냅샷 후보 중 부채비율을 모르는 종목은 그동안 캐시에 쌓인 값으로만 채움 (네트워크 요청 없음)
+            missing = prev_screener.missing_debt(prev_screener.candidates(**params).index)
+            if missing:
+                known = get_fundamentals_cache().get_many(missing)['부채비율']
+                if not known.empty: prev_screener.set_debt_ratios(known)
+            df_new, df_dropped, df_moves = diff_results(prev_screener.screen(**params, max_debt=in_max_debt),
+                                                        screener.screen(**params, max_debt=in_max_debt))
+            d1, d2, d3 = st.columns(3)
+            d1.metric("새로 들어온 종목", f"{len(df_new)}개")
+            d2.metric("빠진 종목", f"{len(df_dropped)}개")
+            d3.metric("큰 변화", f"{df_moves.index.nunique()}개 종목")
+            if not df_new.empty:
+                st.markdown("#### ➕ 새로 들어온 종목")
+                st.dataframe(result_table(df_new), use_container_width=True, hide_index=True)
+            if not df_dropped.empty:
+                st.markdown("#### ➖ 빠진 종목 (이전 스냅샷 값)")
+                reasons = screener.failed_conditions(df_dropped.index, **params, max_debt=in_max_debt)
+                st.dataframe(result_table(df_dropped).assign(**{'빠진 이유': reasons.to_numpy()}),
+                             use_container_width=True, hide_index=True)
+            if not df_moves.empty:
+                st.markdown("#### ↕️ 지표가 크게 바뀐 종목")
+                st.dataframe(df_moves.rename(columns={'Name': '종목명'}).round(2), use_container_width=True, hide_index=True)
+
+# 백그라운드 갱신 스레드는 화면을 다 그린 뒤에 시작 (새 프로세스의 첫 스캔이 첫 화면과 CPU 를 다투지 않도록)
+get_cache_warmer()
@@ -0,0 +1,139 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from market_data import MIN_MARKET_CAP, SNAPSHOT_KEY
+from metrics import metrics
+from screener import cast_like
+
+# ---------------------------------------------------------
+# [백테스트] 쌓아 둔 일별 스냅샷 위에서 같은 조건을 리밸런싱 날짜마다 다시 적용
+# ---------------------------------------------------------
+FIELDS = ('종가', '시가총액', '거래대금', '영업이익', 'PER', 'PBR', 'ROE', '외국인비율', '부채비율')
+REBALANCE = {'매일': 'D', '매주': 'W', '매월': 'M'}
+WEIGHTINGS = {'동일 비중': 'equal', '시가총액 비중': 'cap'}
+
+def load_history(store, market=SNAPSHOT_KEY, start=None):
+    """저장된 일별 스냅샷 -> ({컬럼: (날짜 x 종목) DataFrame}, 종목명 Series).
+    한 번이라도 고정 조건(시총/흑자)을 통과한 종목만 남김"""
+    with metrics.timer('backtest', 'load'):
+        long = store.read_history(market, ('Name',) + FIELDS, start)
+        if long.empty: return {}, pd.Series(dtype=object)
+
+        universe = long.loc[(long['시가총액'] >= MIN_MARKET_CAP) & (long['영업이익'] > 0), 'Ticker'].unique()
+        long = long[long['Ticker'].isin(universe)]
+        # 종목명은 가장 최근 이름 사용
+        names = long.groupby('Ticker')['Name'].last()
+        long = long.drop(columns='Name').drop_duplicates(['Date', 'Ticker'], keep='last')
+        wide = long.pivot(index='Date', columns='Ticker')
+    return {col: wide[col] for col in FIELDS if col in wide}, names
+
+def summarize(equity):
+    """누적 수익 곡선(1.0 에서 시작) -> 성과 요약 (% 단위)"""
+    if len(equity) < 2: return {'총수익률': 0.0, '연수익률': 0.0, '최대낙폭': 0.0, '연변동성': 0.0}
+    returns = equity.pct_change().dropna()
+    years = max((equity.index[-1] - equity.index[0]).days / 365.25, 1 / 365.25)
+    periods_per_year = len(returns) / years
+    return {
+        '총수익률': (equity.iloc[-1] - 1) * 100,
+        '연수익률': (equity.iloc[-1] ** (1 / years) - 1) * 100,
+        '최대낙폭': (equity / equity.cummax() - 1).min() * 100,
+        '연변동성': returns.std() * np.sqrt(periods_per_year) * 100,
+    }
+
+class Backtest:
+    """리밸런싱 날짜 x 종목 배열로 조건 마스크와 다음 리밸런싱까지의 수익률을 한 번에 계산.
+    부채비율은 스냅샷에 저장된 값을 쓰고, 없으면 지금 캐시에 있는 값으로 대신함 (과거 값이 아니므로 참고용)"""
+
+    def __init__(self, panels, names, debt_ratios=None, rebalance='M'):
+        daily = panels['종가'].sort_index()
+        dates = daily.index
+        if rebalance != 'D':
+            # 기간(주/월)마다 마지막 스냅샷 날짜에 리밸런싱
+            dates = pd.DatetimeIndex(dates.to_series().groupby(dates.to_period(rebalance)).max().to_numpy())
+        self.dates = dates
+        self.tickers = daily.columns
+        self.names = names.reindex(self.tickers).fillna('')
+
+        def values(col):
+            # float32 로 저장된 비율 컬럼은 그대로 (빈 칸이 있는 정수 컬럼은 pivot 에서 이미 float64)
+            x = panels[col].reindex(index=dates, columns=self.tickers).to_numpy()
+            return x if x.dtype.kind == 'f' else x.astype('float64')
+        self.values = {col: values(col) for col in FIELDS if col in panels}
+        # 거래정지/상장폐지 등으로 값이 빠진 날은 직전 종가로 보고 수익률 0
+        close = daily.ffill().reindex(dates).to_numpy(dtype='float64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.returns = np.nan_to_num(close[1:] / close[:-1] - 1)
+
+        current = pd.Series(debt_ratios if debt_ratios is not None else {}, dtype='float64').reindex(self.tickers)
+        debt = self.values.get('부채비율', np.full((len(dates), len(self.tickers)), np.nan))
+        self.values['부채비율'] = np.where(np.isnan(debt), current.to_numpy()[None, :], debt)
+
+        v = self.values
+        self._base = (v['시가총액'] >= MIN_MARKET_CAP) & (v['영업이익'] > 0)
+        self._conditions = {}
+
+    def _memo(self, key, compute):
+        """같은 (컬럼, 기준값) 조건은 grid 안에서 한 번만 계산. 슬라이더 값마다 쌓이므로 너무 많아지면 비움"""
+        mask = self._conditions.get(key)
+        if mask is None:
+            if len(self._conditions) > 64: self._conditions.clear()
+            mask = self._conditions[key] = compute()
+        return mask
+
+    def _condition(self, col, op, threshold):
+        """(날짜 x 종목) 조건 배열"""
+        def compute():
+            x = self.values[col]
+            t = cast_like(x, threshold)
+            with np.errstate(invalid='ignore'):
+                if op == 'ge': return x >= t
+                if op == 'le': return x <= t
+                return (x > 0) & (x <= t)   # PER/PBR: 0 이하(적자 등)는 제외
+        return self._memo((col, op, threshold), compute)
+
+    def _keyword(self, exclude):
+        def compute():
+            keep = ~self.names.str.contains(exclude).to_numpy(dtype=bool) if exclude else np.ones(len(self.tickers), dtype=bool)
+            return keep[None, :]
+        return self._memo(('Name', 'exclude', exclude), compute)
+
+    def holdings(self, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude, max_debt):
+        """Screener.screen 과 같은 조건을 모든 리밸런싱 날짜에 한 번에 적용한 (날짜 x 종목) 마스크"""
+        return (self._base
+                & self._condition('거래대금', 'ge', min_amt)
+                & self._condition('PBR', 'pos_le', max_pbr)
+                & self._condition('PER', 'pos_le', max_per)
+                & self._condition('ROE', 'ge', min_roe)
+                & self._condition('외국인비율', 'ge', min_foreign)
+                & self._condition('부채비율', 'le', max_debt)
+                & self._keyword(exclude))
+
+    def equity(self, mask, weighting='equal'):
+        """보유 마스크 -> 누적 수익 곡선. 조건을 통과한 종목이 없는 기간은 현금(수익률 0)"""
+        weights = mask[:-1] * (np.nan_to_num(self.values['시가총액'][:-1]) if weighting == 'cap' else 1.0)
+        total = weights.sum(axis=1, keepdims=True)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            period = np.where(total[:, 0] > 0, (weights * self.returns).sum(axis=1) / total[:, 0], 0.0)
+        return pd.Series(np.concatenate([[1.0], np.cumprod(1 + period)]), index=self.dates)
+
+    def run(self, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude, max_debt, weighting='equal'):
+        """(누적 수익 곡선, 날짜별 보유 종목 수)"""
+        mask = self.holdings(max_per, max_pbr, min_roe, min_foreign, min_amt, exclude, max_debt)
+        return self.equity(mask, weighting), pd.Series(mask.sum(axis=1), index=self.dates)
+
+    def benchmark(self, weighting='cap'):
+        """고정 조건(시총 4,000억 이상, 흑자)만 통과한 종목 전체"""
+        return self.equity(self._base, weighting)
+
+    def sweep(self, grid, fixed, weighting='equal'):
+        """grid: {조건 이름: 값 목록}, fixed: 나머지 조건. 모든 조합의 성과 요약을 한 표로 (조건 값 + 성과 컬럼)"""
+        keys = list(grid)
+        rows = []
+        with metrics.timer('backtest', 'sweep'):
+            for combo in itertools.product(*(grid[k] for k in keys)):
+                params = {**fixed, **dict(zip(keys, combo))}
+                mask = self.holdings(**params)
+                rows.append({**dict(zip(keys, combo)), **summarize(self.equity(mask, weighting)), '평균 종목수': mask.sum(axis=1).mean()})
+        return pd.DataFrame(rows)
@@ -0,0 +1,252 @@
+"""벤치마크용 네이버 금융 페이지 fixture 생성
+
+    python -m bench.make_fixtures                   # 네이버와 같은 마크업으로 합성 (네트워크 불필요)
+    python -m bench.make_fixtures --record          # 실제 페이지 표본을 bench/fixtures-recorded 에 저장
+    python -m bench.make_fixtures --record --full   # 실제 페이지를 전부 (시장 전체, 일별 시세 전체)
+
+모든 페이지는 네이버와 같이 EUC-KR 로 인코딩해 gzip 으로 저장하고, 어떻게 만들었는지를 SOURCE 파일에 남김.
+저장소에 들어 있는 bench/fixtures 는 합성(synthetic)뿐이므로 파서는 아직 실제 네이버 마크업이 아니라
+여기서 흉내 낸 마크업으로만 확인된 것임. 녹화한 표본은 합성 fixture 옆에 따로 두고 python -m bench.run --fixtures bench/fixtures-recorded 로 돌림
+(시장별로 1페이지만 있으면 대역 서버가 그 페이지를 반복하므로 파싱 단계 수치를 합성 마크업과 비교하는 용도)
+"""
+import argparse
+import gzip
+import os
+import random
+import shutil
+from datetime import date, timedelta
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+RECORDED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures-recorded')
+RECORD_SAMPLE = {'market_pages': 1, 'item_tickers': 1, 'daily_pages': 3}   # --full 이 아닐 때 받는 양
+
+ROWS_PER_PAGE = 50
+# sosok -> (시장 이름, 페이지 수, 마지막 페이지 행 수, 종목코드 시작, 시가총액 규모(억))
+MARKETS = {0: ('코스피', 44, 31, 100000, 5000000), 1: ('코스닥', 36, 12, 200000, 800000)}
+ITEM_TICKERS = ['005930', '000660', '005380', '035420', '051910', '105560', '012330', '028260']
+DAILY_TICKER = '005930'
+DAILY_END = date(2026, 10, 16)
+DAILY_ROWS = 1300   # 약 5년치 거래일
+
+RATIO_RANGES = {'부채비율': (10, 400), '당좌비율': (30, 300), '유보율': (100, 5000)}
+
+MARKET_HEADERS = ['N', '종목명', '현재가', '전일비', '등락률', '액면가', '거래량', '거래대금',
+                  '시가총액', '영업이익', 'PER', 'ROE', 'PBR', '배당수익률', '외국인비율', '토론실']
+
+def fixture_source(root):
+    """fixture 를 만든 방식 ('synthetic' / 'recorded'). SOURCE 파일이 없으면 'unknown'"""
+    try:
+        with open(os.path.join(root, 'SOURCE'), encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return 'unknown'
+
+def write_source(root, source):
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, 'SOURCE'), 'w', encoding='utf-8', newline='\n') as f:
+        f.write(source + '\n')
+
+def write(path, html):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = html if isinstance(html, bytes) else html.encode('euc-kr')
+    with gzip.open(path, 'wb') as f:
+        f.write(data)
+
+# ---------------------------------------------------------
+# [합성] 네이버 마크업을 흉내 낸 페이지
+# ---------------------------------------------------------
+def market_row(r, sosok, idx):
+    # 시가총액(억)은 순위에 따라 줄어들게 해서 실제처럼 4,000억 이상이 수백 종목 정도 되도록 함
+    name, _, _, code_base, cap_scale = MARKETS[sosok]
+    code = f"{code_base + idx:06d}"
+    up = r.random() < 0.5
+    price = r.randint(1000, 300000)
+    change = r.randint(0, price // 20)
+    rate = change / price * 100 * (1 if up else -1)
+    arrow = ('bu_pup', '상승', 'red02') if up else ('bu_pdn', '하락', 'nv01')
+    per = 'N/A' if r.random() < 0.1 else f"{r.uniform(1, 60):.2f}"
+    return f'''<tr onMouseOver="mouseOver(this)" onMouseOut="mouseOut(this)">
+<td class="no">{idx}</td>
+<td><a href="/item/main.naver?code={code}" class="tltle">{name}{idx}</a></td>
+<td class="number">{price:,}</td>
+<td class="number">
+<em class="bu_p {arrow[0]}"><span class="blind">{arrow[1]}</span></em><span class="tah p11 {arrow[2]}">
+{change:,}
+</span>
+</td>
+<td class="number">
+<span class="tah p11 {arrow[2]}">
+{rate:+.2f}%
+</span>
+</td>
+<td class="number">100</td>
+<td class="number">{r.randint(1000, 9000000):,}</td>
+<td class="number">{r.randint(10, 900000):,}</td>
+<td class="number">{int(cap_scale * idx ** -1.2 * r.uniform(0.98, 1.0)):,}</td>
+<td class="number">{r.randint(-5000, 50000):,}</td>
+<td class="number">{per}</td>
+<td class="number">{r.uniform(-10, 30):.2f}</td>
+<td class="number">{r.uniform(0.2, 5):.2f}</td>
+<td class="number">{r.uniform(0, 7):.2f}</td>
+<td class="number">{r.uniform(0, 60):.2f}</td>
+<td class="center"><a href="/item/board.naver?code={code}"><img src="https://ssl.pstatic.net/imgstock/images5/ico_debatebl2.gif" width="15" height="13" alt="토론실"></a></td>
+</tr>
+'''
+
+def market_page(sosok, page, n_rows):
+    r = random.Random(sosok * 1000 + page)
+    name, n_pages = MARKETS[sosok][:2]
+    rows = []
+    for k in range(n_rows):
+        rows.append(market_row(r, sosok, (page - 1) * ROWS_PER_PAGE + k + 1))
+        if k % 5 == 4: rows.append('<tr><td class="division_line" colspan="16"></td></tr>\n')
+    ths = ''.join(f'<th scope="col">{h}</th>' for h in MARKET_HEADERS)
+    # 네이버처럼 10페이지 단위로 보여주고, 마지막 묶음에서는 '맨뒤' 링크가 없음
+    block = (page - 1) // 10 * 10
+    pages = ''.join(f'<td><a href="/sise/sise_market_sum.naver?sosok={sosok}&amp;page={p}">{p}</a></td>'
+                    for p in range(block + 1, min(block + 10, n_pages) + 1))
+    if block + 10 < n_pages:
+        pages += f'\n<td class="pgRR"><a href="/sise/sise_market_sum.naver?sosok={sosok}&amp;page={n_pages}">맨뒤</a></td>'
+    return f'''<html lang="ko"><head><meta http-equiv="Content-Type" content="text/html; charset=euc-kr"><title>시가총액 : 네이버 금융</title></head>
+<body><div id="contentarea">
+<table class="type_1"><tr><td><form name="option_form"><input type="checkbox" name="fieldIds" value="quant" checked>거래량</form></td></tr></table>
+<div class="box_type_l">
+<table class="type_2" cellspacing="0" summary="{name} 시가총액 순위"><caption>{name}</caption>
+<colgroup>{'<col>' * len(MARKET_HEADERS)}</colgroup>
+<thead><tr>{ths}</tr></thead>
+<tbody>
+<tr><td class="blank_08" colspan="16"></td></tr>
+{''.join(rows)}<tr><td class="blank_06" colspan="16"></td></tr>
+</tbody></table></div>
+<table summary="페이지 네비게이션 리스트" class="Nnavi" align="center"><tr>{pages}</tr></table>
+</div></body></html>
+'''
+
+def item_main_page(ticker):
+    r = random.Random(int(ticker))
+    periods = ['2022.12', '2023.12', '2024.12', '2025.12<br>(E)',
+               '2025.03', '2025.06', '2025.09', '2025.12', '2026.03', '2026.06<br>(E)']
+    labels = ['매출액', '영업이익', '당기순이익', '영업이익률', '순이익률', 'ROE(지배주주)', '부채비율',
+              '당좌비율', '유보율', 'EPS(원)', 'PER(배)', 'BPS(원)', 'PBR(배)', '주당배당금(원)',
+              '시가배당률(%)', '배당성향(%)']
+    body = []
+    for label in labels:
+        cells = []
+        for j in range(len(periods)):
+            # 추정치 컬럼은 비율이 비어 있는 경우가 많음
+            blank = j in (3, 9) and label in ('부채비율', '당좌비율', '유보율')
+            low, high = RATIO_RANGES.get(label, (10, 3000))
+            value = '' if blank else f"{r.uniform(low, high):,.2f}"
+            cells.append(f'<td class="">\n\t\t\t\t{value}\n\t\t\t</td>')
+        body.append(f'<tr><th scope="row" class="h_th2 th_cop_anal8"><strong>{label}</strong></th>{"".join(cells)}</tr>')
+    ths = ''.join(f'<th scope="col" class="">{p}</th>' for p in periods)
+    return f'''<html lang="ko"><head><meta http-equiv="Content-Type" content="text/html; charset=euc-kr"></head>
+<body><div class="section trade_compare"><table class="tb_type1 tb_num"><caption>동일업종비교</caption>
+<thead><tr><th scope="col">종목명</th><th scope="col">삼성전자</th></tr></thead>
+<tbody><tr><th scope="row">현재가</th><td>71,000</td></tr></tbody></table></div>
+<div class="section cop_analysis"><div class="sub_section"><table class="tb_type1 tb_num tb_info"><caption>기업실적분석 테이블</caption>
+<thead>
+<tr><th scope="col" rowspan="3" class="h_th2 th_cop_anal1"><strong>주요재무정보</strong></th><th colspan="4" scope="col"><strong>최근 연간 실적</strong></th><th colspan="6" scope="col"><strong>최근 분기 실적</strong></th></tr>
+<tr>{ths}</tr>
+<tr>{'<th scope="col">IFRS연결</th>' * len(periods)}</tr>
+</thead>
+<tbody>{''.join(body)}</tbody></table></div></div>
+</body></html>
+'''
+
+def trading_days():
+    days, d = [], DAILY_END
+    while len(days) < DAILY_ROWS:
+        if d.weekday() < 5: days.append(d)
+        d -= timedelta(days=1)
+    return days
+
+def daily_page(page, days):
+    r = random.Random(page)
+    chunk = days[(page - 1) * 10:page * 10]
+    last_page = (len(days) + 9) // 10
+    rows = []
+    for i, d in enumerate(chunk):
+        close = 50000 + (d.toordinal() % 997) * 13
+        rows.append(f'''<tr onmouseover="mouseOver(this)" onmouseout="mouseOut(this)">
+<td align="center"><span class="tah p10 gray03">{d:%Y.%m.%d}</span></td>
+<td class="num"><span class="tah p11">{close:,}</span></td>
+<td class="num"><em class="bu_p bu_pup"><span class="blind">상승</span></em><span class="tah p11 red02">{r.randint(0, 900):,}</span></td>
+<td class="num"><span class="tah p11">{close:,}</span></td>
+<td class="num"><span class="tah p11">{close + 500:,}</span></td>
+<td class="num"><span class="tah p11">{close - 500:,}</span></td>
+<td class="num"><span class="tah p11">{r.randint(10000, 9999999):,}</span></td>
+</tr>
+''')
+        if i == 4: rows.append('<tr><td colspan="7" height="8"></td></tr>\n')
+    return f'''<html lang="ko"><head><meta http-equiv="Content-Type" content="text/html; charset=euc-kr"></head>
+<body><table class="type2">
+<tr><th>날짜</th><th>종가</th><th>전일비</th><th>시가</th><th>고가</th><th>저가</th><th>거래량</th></tr>
+<tr><td colspan="7" height="8"></td></tr>
+{''.join(rows)}</table>
+<table class="Nnavi" summary="페이지 네비게이션 리스트"><tr><td class="on"><a href="/item/sise_day.naver?code={DAILY_TICKER}&amp;page={page}">{page}</a></td>
+<td class="pgRR"><a href="/item/sise_day.naver?code={DAILY_TICKER}&amp;page={last_page}">맨뒤</a></td></tr></table>
+</body></html>
+'''
+
+def synthesize(root):
+    write_source(root, 'synthetic')
+    for sosok, (_, n_pages, last_rows, _, _) in MARKETS.items():
+        # 마지막 페이지 다음에는 빈 페이지 하나
+        for page in range(1, n_pages + 2):
+            n_rows = ROWS_PER_PAGE if page < n_pages else last_rows if page == n_pages else 0
+            write(os.path.join(root, 'sise_market_sum', str(sosok), f"{page:02d}.html.gz"), market_page(sosok, page, n_rows))
+    for ticker in ITEM_TICKERS:
+        write(os.path.join(root, 'item_main', f"{ticker}.html.gz"), item_main_page(ticker))
+    days = trading_days()
+    for page in range(1, (len(days) + 9) // 10 + 1):
+        write(os.path.join(root, 'sise_day', f"{page:03d}.html.gz"), daily_page(page, days))
+
+# ---------------------------------------------------------
+# [녹화] 실제 네이버 페이지 저장
+# ---------------------------------------------------------
+def record(root, full=False):
+    import requests
+    market_pages = 99 if full else RECORD_SAMPLE['market_pages']
+    item_tickers = ITEM_TICKERS if full else ITEM_TICKERS[:RECORD_SAMPLE['item_tickers']]
+    daily_pages = 399 if full else RECORD_SAMPLE['daily_pages']
+    write_source(root, 'recorded')
+    headers = {'User-Agent': 'Mozilla/5.0'}
+    session = requests.Session()
+    session.post('https://finance.naver.com/sise/field_submit.naver', headers=headers, data={
+        'menu': 'market_sum',
+        'returnUrl': 'http://finance.naver.com/sise/sise_market_sum.naver',
+        'fieldIds': ['quant', 'amount', 'market_sum', 'per', 'roe', 'pbr', 'dividend_yield', 'operating_profit', 'frgn_rate']
+    })
+    for sosok in MARKETS:
+        for page in range(1, market_pages + 1):
+            res = session.get(f'https://finance.naver.com/sise/sise_market_sum.naver?sosok={sosok}&page={page}', headers=headers)
+            res.raise_for_status()
+            write(os.path.join(root, 'sise_market_sum', str(sosok), f"{page:02d}.html.gz"), res.content)
+            if b'class="tltle"' not in res.content: break
+    for ticker in item_tickers:
+        res = session.get(f'https://finance.naver.com/item/main.naver?code={ticker}', headers=headers)
+        res.raise_for_status()
+        write(os.path.join(root, 'item_main', f"{ticker}.html.gz"), res.content)
+    seen = set()
+    for page in range(1, daily_pages + 1):
+        res = session.get('https://finance.naver.com/item/sise_day.naver', headers=headers,
+                          params={'code': DAILY_TICKER, 'page': page})
+        res.raise_for_status()
+        # 마지막 페이지 이후에는 같은 페이지가 반복됨
+        if res.content in seen: break
+        seen.add(res.content)
+        write(os.path.join(root, 'sise_day', f"{page:03d}.html.gz"), res.content)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--record', action='store_true', help='finance.naver.com 에서 실제 페이지를 받아 저장')
+    parser.add_argument('--full', action='store_true', help='--record 일 때 표본이 아니라 모든 페이지를 받음')
+    parser.add_argument('--out', help='저장 위치 (기본: 합성은 bench/fixtures, 녹화는 bench/fixtures-recorded)')
+    args = parser.parse_args()
+    out = args.out or (RECORDED_DIR if args.record else FIXTURE_DIR)
+    shutil.rmtree(out, ignore_errors=True)
+    record(out, args.full) if args.record else synthesize(out)
+
+if __name__ == '__main__':
+    main()
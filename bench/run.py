@@ -0,0 +1,235 @@
+"""오프라인 벤치마크 - 로컬 대역 서버를 상대로 수집/파싱/필터/차트 단계를 잼
+
+    python -m bench.run                          # 기본 설정 (지연 50ms)
+    python -m bench.run --latency-ms 120 --error-rate 0.02 --json bench_output.txt
+    python -m bench.run --baseline old.json      # 기준보다 느려지면 종료 코드 1
+
+단계마다 벽시계 시간, CPU 시간(이 프로세스 기준, 서버는 별도 프로세스), 최대 메모리(tracemalloc)를 기록함.
+기본 fixture(bench/fixtures)는 합성 페이지뿐이라, 파싱 단계는 실제 네이버 마크업이 아닌 합성 마크업 기준 수치임
+(결과 첫 줄과 JSON 의 'fixtures' 에 표시됨)
+측정 중에는 tracemalloc 이 켜져 있어 실제보다 CPU 시간이 조금 더 나옴
+"""
+import argparse
+import glob
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import closing
+
+from bench.make_fixtures import FIXTURE_DIR, fixture_source
+
+def start_server(args):
+    cmd = [sys.executable, '-m', 'bench.server', '--port', '0',
+           '--latency-ms', str(args.latency_ms), '--jitter-ms', str(args.jitter_ms),
+           '--error-rate', str(args.error_rate), '--fixtures', args.fixtures]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen(cmd, cwd=root, stdout=subprocess.PIPE, text=True)
+    base_url = proc.stdout.readline().strip()
+    if not base_url.startswith('http'):
+        proc.kill()
+        sys.exit("대역 서버를 시작하지 못했습니다")
+    return proc, base_url
+
+class Stage:
+    """with Stage('이름', results): ... 로 한 단계를 측정"""
+
+    def __init__(self, name, results):
+        self.name = name
+        self.results = results
+        self.info = {}
+
+    def __enter__(self):
+        tracemalloc.start()
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.results[self.name] = {'wall_s': round(wall, 4), 'cpu_s': round(cpu, 4),
+                                   'peak_mb': round(peak / 1e6, 2), **self.info}
+
+def synthesize_history(df_all, store, days, seed=0):
+    """현재 스냅샷을 바탕으로 가격이 무작위로 움직인 과거 일별 스냅샷을 만들어 저장 (백테스트용)"""
+    import numpy as np
+    import pandas as pd
+    rng = np.random.default_rng(seed)
+    # 장 마감 뒤(15:40)에 찍은 것으로 저장
+    dates = pd.bdate_range(end='2026-10-16', periods=days) + pd.Timedelta(hours=15, minutes=40)
+    moves = np.exp(np.cumsum(rng.normal(0.0003, 0.02, (days, len(df_all))), axis=0))
+    moves /= moves[-1]   # 마지막 날이 현재 스냅샷과 같아지도록
+    for i, taken_at in enumerate(dates):
+        m = moves[i]
+        df = df_all.assign(종가=(df_all['종가'] * m).round(), 시가총액=df_all['시가총액'] * m,
+                           PER=df_all['PER'] * m, PBR=df_all['PBR'] * m,
+                           거래대금=df_all['거래대금'] * rng.lognormal(0, 0.5, len(df_all)))
+        store.save('KRX', df, taken_at.to_pydatetime())
+    return len(dates)
+
+def run(args):
+    # market_data 는 불러올 때 NAVER_BASE_URL 을 읽으므로 서버를 먼저 띄움
+    proc, base_url = start_server(args)
+    os.environ['NAVER_BASE_URL'] = base_url
+    data_dir = tempfile.mkdtemp(prefix='stock-bench-')
+    os.environ['STOCK_DATA_DIR'] = data_dir
+
+    import market_data
+    from charts import price_figure, with_moving_averages
+    from screener import Screener, diff_results, stream_screen
+    from signals import SIGNAL_DAYS, technical_signals
+    from backtest import Backtest, load_history, summarize
+    from store import FundamentalsCache, PriceStore, SnapshotStore
+
+    results = {}
+    try:
+        pages = []
+        for path in sorted(glob.glob(os.path.join(args.fixtures, 'sise_market_sum', '*', '*.html.gz'))):
+            with gzip.open(path, 'rb') as f: pages.append(f.read())
+        with Stage('parse_market_pages', results) as st:
+            rows = sum(len(market_data.parse_market_page(p)[0]) for p in pages)
+            st.info = {'pages': len(pages), 'rows': rows}
+
+        # 빈 캐시에서 스트리밍으로 첫 결과가 나올 때까지 (나머지 요청은 닫을 때 취소)
+        with Stage('stream_first_result', results) as st:
+            stream = stream_screen(market_data.stream_market_data(SnapshotStore(os.path.join(data_dir, 'stream'))),
+                                   FundamentalsCache(os.path.join(data_dir, 'stream.arrow')), 200.0,
+                                   10.0, 1.0, 10.0, 5.0, 300000000, '은행|지주')
+            with closing(stream): first = next(stream, None)
+            st.info = {'rows': 0 if first is None else len(first)}
+
+        snapshots = SnapshotStore(os.path.join(data_dir, 'snapshots'))
+        with Stage('scan_cold', results) as st:
+            df_all = market_data.load_market_data(snapshots, args.workers)
+            st.info = {'rows': len(df_all), **df_all['Market'].value_counts().to_dict()}
+        with Stage('scan_warm', results) as st:
+            df_all = market_data.load_market_data(snapshots, args.workers)
+            # 모든 세션이 같이 쓰는 스냅샷 DataFrame 의 메모리 크기
+            st.info = {'rows': len(df_all), 'frame_kb': int(df_all.memory_usage(deep=True).sum()) // 1024}
+
+        tickers = market_data.prescreen(df_all).index
+        cache = FundamentalsCache(os.path.join(data_dir, 'fundamentals.arrow'))
+        with Stage('debt_ratio_cold', results) as st:
+            ratios = market_data.get_debt_ratios(tickers, cache)
+            st.info = {'tickers': len(tickers), 'found': len(ratios)}
+        with Stage('debt_ratio_warm', results) as st:
+            ratios = market_data.get_debt_ratios(tickers, cache)
+            st.info = {'tickers': len(tickers), 'found': len(ratios)}
+
+        with Stage('screen', results) as st:
+            screener = Screener(df_all, ratios)
+            n = 0
+            for max_per in (5.0, 10.0, 15.0, 20.0, 30.0):
+                for max_pbr in (0.5, 1.0, 2.0):
+                    for min_roe in (0.0, 5.0, 10.0):
+                        n += len(screener.screen(max_per, max_pbr, min_roe, 5.0, 300000000, '은행|지주', 200.0))
+            st.info = {'queries': 45, 'hits': n}
+
+        prices = PriceStore(os.path.join(data_dir, 'prices'))
+        daily_tickers = list(df_all.index[:args.daily_tickers])
+        with Stage('daily_history_cold', results) as st:
+            n = sum(len(market_data.load_daily_history(t, prices)) for t in daily_tickers)
+            st.info = {'tickers': len(daily_tickers), 'rows': n}
+        with Stage('daily_history_warm', results) as st:
+            n = sum(len(market_data.load_daily_history(t, prices)) for t in daily_tickers)
+            st.info = {'tickers': len(daily_tickers), 'rows': n}
+
+        # 결과 종목 여러 개의 이동평균/52주/변동성 지표 (일별 시세 이력을 동시에 받아 한 표로 계산)
+        signal_tickers = list(tickers[-args.signal_tickers:])
+        for name in ('signals_cold', 'signals_warm'):
+            with Stage(name, results) as st:
+                panel = market_data.load_price_panel(signal_tickers, prices, SIGNAL_DAYS)
+                signals = technical_signals(panel)
+                st.info = {'tickers': len(signal_tickers), 'with_ma240': int(signals['MA240'].notna().sum())}
+
+        # 과거 일별 스냅샷(합성)을 쌓아 두고 같은 조건을 리밸런싱마다 다시 적용
+        history = SnapshotStore(os.path.join(data_dir, 'history'))
+        synthesize_history(df_all, history, args.backtest_days)
+        with Stage('backtest_load', results) as st:
+            panels, names = load_history(history)
+            st.info = {'days': len(panels['종가']), 'tickers': len(names)}
+        with Stage('backtest_run', results) as st:
+            bt = Backtest(panels, names, ratios, rebalance='D')
+            equity, held = bt.run(10.0, 1.0, 10.0, 5.0, 300000000, '은행|지주', 200.0)
+            st.info = {'total_return': round(summarize(equity)['총수익률'], 1), 'avg_held': round(held.mean(), 1)}
+        with Stage('backtest_sweep', results) as st:
+            grid = {'max_per': [5.0, 10.0, 15.0, 20.0, 30.0], 'max_pbr': [0.5, 1.0, 2.0],
+                    'min_roe': [0.0, 5.0, 10.0], 'max_debt': [100.0, 200.0]}
+            fixed = dict(min_foreign=5.0, min_amt=300000000, exclude='은행|지주')
+            table = bt.sweep(grid, fixed)
+            st.info = {'combos': len(table), 'best_cagr': round(table['연수익률'].max(), 1)}
+
+        # 마지막 두 거래일 스냅샷에 같은 조건을 적용해 종목코드 기준으로 비교
+        with Stage('snapshot_diff', results) as st:
+            df_curr, curr_at = history.load('KRX', fresh_only=False)
+            df_prev, _ = history.load_previous('KRX', curr_at)
+            query = (10.0, 1.0, 10.0, 5.0, 300000000, '은행|지주', 200.0)
+            new, dropped, moves = diff_results(Screener(df_prev, ratios).screen(*query), Screener(df_curr, ratios).screen(*query))
+            st.info = {'new': len(new), 'dropped': len(dropped), 'moves': len(moves)}
+
+        df_price = market_data.load_daily_history(daily_tickers[0], prices)
+        with Stage('chart', results) as st:
+            price_figure(with_moving_averages(df_price), daily_tickers[0]).to_json()
+            st.info = {'points': len(df_price)}
+    finally:
+        proc.kill()
+    return results
+
+def print_table(results):
+    print(f"{'stage':<22}{'wall(s)':>10}{'cpu(s)':>10}{'peak(MB)':>10}  info")
+    for name, r in results.items():
+        info = ', '.join(f"{k}={v}" for k, v in r.items() if k not in ('wall_s', 'cpu_s', 'peak_mb'))
+        print(f"{name:<22}{r['wall_s']:>10.3f}{r['cpu_s']:>10.3f}{r['peak_mb']:>10.2f}  {info}")
+
+def compare(results, baseline, tolerance):
+    """기준보다 wall/cpu 가 tolerance 비율 이상 느려진 단계 목록 (10ms 미만 차이는 무시)"""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if not base: continue
+        for key in ('wall_s', 'cpu_s'):
+            if r[key] > base[key] * (1 + tolerance) and r[key] - base[key] > 0.01:
+                regressions.append(f"{name}.{key}: {base[key]:.3f} -> {r[key]:.3f}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--workers', type=int, default=8, help='시장 스캔 동시 요청 수')
+    parser.add_argument('--daily-tickers', type=int, default=2, help='일별 시세를 받을 종목 수')
+    parser.add_argument('--signal-tickers', type=int, default=10, help='기술적 지표를 계산할 종목 수')
+    parser.add_argument('--backtest-days', type=int, default=750, help='백테스트용으로 합성할 과거 스냅샷 일수')
+    parser.add_argument('--fixtures', default=FIXTURE_DIR)
+    parser.add_argument('--json', help='결과를 JSON 으로 저장할 경로')
+    parser.add_argument('--baseline', help='비교할 이전 결과 JSON')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    source = fixture_source(args.fixtures)
+    results = run(args)
+    note = ' - 실제 네이버 페이지가 아닌 합성 마크업' if source == 'synthetic' else ''
+    print(f"fixtures: {source} ({args.fixtures}){note}")
+    print_table(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'fixtures': source, **results}, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('fixtures', source) != source:
+            print(f"주의: 기준 결과는 {baseline['fixtures']} fixture 로 잰 것이라 파싱 단계는 직접 비교하기 어려움")
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions: print(f"REGRESSION {line}")
+        if regressions: sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""네이버 금융 대역 서버 - bench/fixtures 의 페이지를 지연/오류를 섞어 돌려줌
+
+    python -m bench.server --port 8800 --latency-ms 80 --error-rate 0.02
+    NAVER_BASE_URL=http://127.0.0.1:8800 streamlit run app.py
+"""
+import argparse
+import glob
+import gzip
+import os
+import random
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bench.make_fixtures import FIXTURE_DIR
+
+def load_fixtures(root=FIXTURE_DIR):
+    """{'sise_market_sum': {sosok: [페이지1, 페이지2, ...]}, 'item_main': {종목코드: 페이지}, 'sise_day': [...]}"""
+    def read(path):
+        with gzip.open(path, 'rb') as f:
+            return f.read()
+    def pages(*kind):
+        return [read(p) for p in sorted(glob.glob(os.path.join(root, *kind, '*.html.gz')))]
+    items = {os.path.basename(p).split('.')[0]: read(p)
+             for p in sorted(glob.glob(os.path.join(root, 'item_main', '*.html.gz')))}
+    if not items: sys.exit(f"fixture 가 없습니다: {root} (python -m bench.make_fixtures 로 생성)")
+    markets = {os.path.basename(d): pages('sise_market_sum', os.path.basename(d))
+               for d in glob.glob(os.path.join(root, 'sise_market_sum', '*')) if os.path.isdir(d)}
+    return {'sise_market_sum': markets, 'item_main': items, 'sise_day': pages('sise_day')}
+
+class NaverStandIn(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'   # keep-alive
+    fixtures = None
+    latency = 0.0
+    jitter = 0.0
+    error_rate = 0.0
+    stats = None
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body=b'', headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=euc-kr')
+        self.send_header('Content-Length', str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay_or_fail(self):
+        with self.stats['lock']:
+            self.stats['requests'] += 1
+        time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+        if random.random() < self.error_rate:
+            with self.stats['lock']:
+                self.stats['errors'] += 1
+            self._send(503, b'Service Unavailable')
+            return True
+        return False
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        if self._delay_or_fail(): return
+        if urlparse(self.path).path == '/sise/field_submit.naver':
+            self._send(200, b'', {'Set-Cookie': 'field_list=12|0000000000000000; Path=/'})
+        else:
+            self._send(404)
+
+    def do_GET(self):
+        if self._delay_or_fail(): return
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        page = int(query.get('page', 1))
+        if url.path == '/sise/sise_market_sum.naver':
+            pages = self.fixtures['sise_market_sum'].get(query.get('sosok', '0'))
+            if not pages: return self._send(404)
+            # 마지막 fixture 는 빈 페이지
+            self._send(200, pages[min(page, len(pages)) - 1])
+        elif url.path == '/item/main.naver':
+            items = self.fixtures['item_main']
+            code = query.get('code', '')
+            body = items.get(code) or list(items.values())[zlib.crc32(code.encode()) % len(items)]
+            self._send(200, body)
+        elif url.path == '/item/sise_day.naver':
+            # 네이버처럼 마지막 페이지를 넘기면 마지막 페이지를 반복
+            pages = self.fixtures['sise_day']
+            self._send(200, pages[min(page, len(pages)) - 1])
+        else:
+            self._send(404)
+
+def serve(port=0, latency_ms=0, jitter_ms=0, error_rate=0.0, fixture_dir=FIXTURE_DIR):
+    """백그라운드 스레드에서 서버를 띄우고 (server, base_url) 반환"""
+    handler = type('Handler', (NaverStandIn,), {
+        'fixtures': load_fixtures(fixture_dir),
+        'latency': latency_ms / 1000, 'jitter': jitter_ms / 1000, 'error_rate': error_rate,
+        'stats': {'requests': 0, 'errors': 0, 'lock': threading.Lock()},
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--port', type=int, default=8800, help='0 이면 빈 포트 자동 선택')
+    parser.add_argument('--latency-ms', type=float, default=50)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='503 으로 응답할 비율 (0~1)')
+    parser.add_argument('--fixtures', default=FIXTURE_DIR)
+    args = parser.parse_args()
+    server, base_url = serve(args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.fixtures)
+    # 벤치마크 러너가 주소를 읽어 가도록 첫 줄에 출력
+    print(base_url, flush=True)
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == '__main__':
+    main()
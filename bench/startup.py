@@ -0,0 +1,52 @@
+"""앱 첫 화면이 그려질 때까지의 시간 - 새 프로세스(콜드 스타트)에서 로그인 화면/로그인 직후 메인 화면을 한 번씩 실행
+
+    python -m bench.startup               # 각 5회, 중앙값
+    python -m bench.startup --repeat 9
+
+streamlit 자체를 불러오는 시간은 빼고, app.py 스크립트가 한 번 도는 시간(앱이 불러오는 모듈 포함)만 잼.
+백그라운드 갱신 스레드가 실제 네이버에 요청하지 않도록 닫힌 포트를 주소로 줌
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 새 프로세스에서 실행할 코드: 스크립트 한 번 실행 시간과 그때 새로 불러온 모듈 목록
+PROBE = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file({app!r}, default_timeout=120)
+if {authenticated}: at.session_state['authenticated'] = True
+before = set(sys.modules)
+start = time.perf_counter()
+at.run()
+elapsed = time.perf_counter() - start
+heavy = sorted(m for m in set(sys.modules) - before if m in ('pandas', 'pyarrow', 'plotly', 'lxml', 'requests', 'numpy'))
+print(json.dumps({{'s': elapsed, 'error': bool(at.exception), 'imported': heavy}}))
+"""
+
+def probe(authenticated):
+    env = dict(os.environ, NAVER_BASE_URL='http://127.0.0.1:9', STOCK_DATA_DIR=tempfile.mkdtemp(prefix='stock-startup-'))
+    code = PROBE.format(app=os.path.join(ROOT, 'app.py'), authenticated=authenticated)
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, env=env, capture_output=True, text=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'page':<10}{'median(s)':>10}{'min(s)':>10}  imported")
+    for page, authenticated in (('login', False), ('main', True)):
+        runs = [probe(authenticated) for _ in range(args.repeat)]
+        times = [r['s'] for r in runs]
+        errors = ' (스크립트 오류)' if any(r['error'] for r in runs) else ''
+        print(f"{page:<10}{statistics.median(times):>10.3f}{min(times):>10.3f}  {','.join(runs[-1]['imported'])}{errors}")
+
+if __name__ == '__main__':
+    main()
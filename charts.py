@@ -0,0 +1,75 @@
+import numpy as np
+import plotly.graph_objects as go
+import plotly.io as pio
+
+# ---------------------------------------------------------
+# [차트] 상세 차트용 이동평균 / 다운샘플링 / plotly 그림
+# ---------------------------------------------------------
+MA_WINDOWS = (120, 240)
+CHART_POINTS = 500   # 화면에 그릴 최대 점 개수
+
+# 한글 글꼴 설정은 모듈을 처음 불러올 때(프로세스당 한 번)만 등록.
+# 브라우저에 설치된 글꼴을 쓰므로 글꼴 파일을 내려받을 필요가 없음
+pio.templates['family'] = go.layout.Template(layout=go.Layout(
+    font=dict(family="NanumGothic, 'Malgun Gothic', 'Apple SD Gothic Neo', sans-serif"),
+    plot_bgcolor='white',
+    xaxis=dict(showgrid=True, gridcolor='rgba(0,0,0,0.08)'),
+    yaxis=dict(showgrid=True, gridcolor='rgba(0,0,0,0.08)'),
+))
+
+def with_moving_averages(df_price):
+    """종가에 MA120/MA240 컬럼을 붙인 새 DataFrame"""
+    if df_price.empty: return df_price
+    return df_price.assign(**{f"MA{w}": df_price['Close'].rolling(w).mean() for w in MA_WINDOWS})
+
+def lttb_indices(y, n_out):
+    """Largest-Triangle-Three-Buckets: 모양을 유지하면서 n_out 개 점의 위치를 고름"""
+    n = len(y)
+    if n_out >= n or n_out < 3: return np.arange(n)
+    x = np.arange(n, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    # 처음/끝 점은 고정, 가운데를 n_out - 2 개 구간으로 나눔
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    picked = np.empty(n_out, dtype=int)
+    picked[0], picked[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # 다음 구간의 평균점 (마지막 구간은 끝 점)
+        nxt_start, nxt_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[nxt_start:nxt_end].mean()
+        avg_y = y[nxt_start:nxt_end].mean()
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        picked[i + 1] = a
+    return picked
+
+def price_figure(df_chart, name, max_points=CHART_POINTS):
+    """종가 + 이동평균선 plotly 그림. 점이 많으면 종가 기준 LTTB 로 줄여서 그림"""
+    idx = lttb_indices(df_chart['Close'].to_numpy(), max_points)
+    df_plot = df_chart.iloc[idx]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(x=df_plot.index, y=df_plot['Close'], name='주가',
+                             line=dict(color='rgba(0,0,0,0.6)', width=1.5)))
+    fig.add_trace(go.Scatter(x=df_plot.index, y=df_plot['MA120'], name='120일선',
+                             line=dict(color='green', dash='dash', width=1.5)))
+    fig.add_trace(go.Scatter(x=df_plot.index, y=df_plot['MA240'], name='240일선',
+                             line=dict(color='red', dash='dash', width=1.5)))
+    fig.update_layout(
+        template='family', title=dict(text=f"{name} 주가 추이 (5년)", font=dict(size=18)),
+        height=500, margin=dict(t=60, l=10, r=10, b=10), hovermode='x unified',
+        legend=dict(orientation='h', yanchor='bottom', y=1.0, xanchor='right', x=1.0)
+    )
+    return fig
+
+def equity_figure(curves, title):
+    """{이름: 누적 수익 곡선(1.0 에서 시작)} -> 누적 수익률(%) 선 그래프"""
+    fig = go.Figure()
+    for name, equity in curves.items():
+        fig.add_trace(go.Scatter(x=equity.index, y=(equity - 1) * 100, name=name, line=dict(width=1.5)))
+    fig.update_layout(
+        template='family', title=dict(text=title, font=dict(size=18)), yaxis_title='누적 수익률 (%)',
+        height=420, margin=dict(t=60, l=10, r=10, b=10), hovermode='x unified',
+        legend=dict(orientation='h', yanchor='bottom', y=1.0, xanchor='right', x=1.0)
+    )
+    return fig
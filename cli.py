@@ -0,0 +1,67 @@
+"""Streamlit 없이 사이드바와 같은 조건으로 종목을 골라 CSV/Parquet 로 저장 (cron, 노트북, 테스트용)
+
+    python cli.py -o result.csv                                   # 사이드바 기본 조건
+    python cli.py --max-per 15 --max-pbr 1.5 --min-roe 8 -o result.parquet
+    python cli.py --refresh --ma-side below --min-drawdown 20 -o result.csv
+
+CSV 는 앱의 다운로드 파일과 같은 표(억 단위, 한글 컬럼명), Parquet 는 원 단위 원래 컬럼 그대로 저장함.
+데이터는 앱과 같은 data/ 폴더(STOCK_DATA_DIR)를 쓰므로, 여기서 받아 둔 스냅샷/재무비율은 앱에서 바로 재사용됨
+"""
+import argparse
+import sys
+
+from market_data import SCAN_WORKERS, load_price_panel
+from screener import DEFAULTS, result_table, run_screen
+from signals import MA_SIDES, SIGNAL_DAYS, signal_mask, technical_signals
+from store import FundamentalsCache, PriceStore, SnapshotStore
+
+MA_SIDE_FLAGS = dict(zip(('any', 'below', 'above'), MA_SIDES))
+
+def stderr_progress(fraction, label):
+    print(f"\r{fraction:4.0%} {label:<20}", end='', file=sys.stderr, flush=True)
+
+def screen(args, progress=None):
+    """인자 -> 결과 DataFrame (기술적 지표까지 붙이고 조건 적용)"""
+    df_res = run_screen(SnapshotStore(max_age_minutes=30), FundamentalsCache(),
+                        args.max_per, args.max_pbr, args.min_roe, args.min_foreign, args.min_amt * 100000000,
+                        args.exclude, args.max_debt, refresh=args.refresh, max_workers=args.workers, progress=progress)
+    if df_res.empty or args.no_signals: return df_res
+    panel = load_price_panel(list(df_res.index), PriceStore(), SIGNAL_DAYS, progress=progress)
+    df_res = df_res.join(technical_signals(panel))
+    return df_res[signal_mask(df_res, MA_SIDE_FLAGS[args.ma_side], args.min_drawdown, args.max_volatility)]
+
+def write(df_res, path):
+    if path.endswith(('.parquet', '.pq')):
+        df_res.to_parquet(path)
+    else:
+        result_table(df_res).to_csv(path, index=False, encoding='utf-8-sig')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('-o', '--output', required=True, help='저장할 경로 (.csv 또는 .parquet)')
+    parser.add_argument('--max-per', type=float, default=DEFAULTS['max_per'])
+    parser.add_argument('--max-pbr', type=float, default=DEFAULTS['max_pbr'])
+    parser.add_argument('--min-roe', type=float, default=DEFAULTS['min_roe'])
+    parser.add_argument('--max-debt', type=float, default=DEFAULTS['max_debt'], help='최대 부채비율 (%%)')
+    parser.add_argument('--min-foreign', type=float, default=DEFAULTS['min_foreign'], help='최소 외국인 지분율 (%%)')
+    parser.add_argument('--min-amt', type=float, default=DEFAULTS['min_amt'] / 100000000, help='최소 거래대금 (억원)')
+    parser.add_argument('--exclude', default=DEFAULTS['exclude'], help="제외 키워드 ('|' 로 구분, 빈 문자열이면 제외 없음)")
+    parser.add_argument('--ma-side', choices=list(MA_SIDE_FLAGS), default='any', help='현재가가 240일선 아래/위')
+    parser.add_argument('--min-drawdown', type=float, default=0.0, help='52주 고점 대비 최소 하락률 (%%)')
+    parser.add_argument('--max-volatility', type=float, default=float('inf'), help='최대 변동성 (연율 %%)')
+    parser.add_argument('--no-signals', action='store_true', help='일별 시세를 받지 않음 (기술적 지표 컬럼/조건 없음)')
+    parser.add_argument('--refresh', action='store_true', help='스냅샷이 유효해도 시장을 새로 스캔')
+    parser.add_argument('--workers', type=int, default=SCAN_WORKERS, help='시장 스캔 동시 요청 수')
+    parser.add_argument('-q', '--quiet', action='store_true', help='진행률을 표시하지 않음')
+    args = parser.parse_args(argv)
+
+    df_res = screen(args, None if args.quiet else stderr_progress)
+    if not args.quiet: print(file=sys.stderr)
+    # 조건에 맞는 종목이 없는 것과 구분: 스냅샷도 없고 스캔도 실패하면 컬럼조차 없음
+    if df_res.columns.empty: sys.exit("시장 데이터를 가져오지 못했습니다 (네트워크 오류 또는 접속 차단)")
+    write(df_res, args.output)
+    print(f"{len(df_res)}개 종목 -> {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
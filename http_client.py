@@ -0,0 +1,115 @@
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+from urllib.parse import urlparse
+
+import requests
+
+from metrics import metrics
+
+# ---------------------------------------------------------
+# [HTTP] 프로세스 전체가 같이 쓰는 네이버 요청 클라이언트
+# ---------------------------------------------------------
+RATE_LIMIT = float(os.environ.get('NAVER_RATE_LIMIT', 30))   # 호스트별 초당 요청 수
+RATE_BURST = 10          # 쉬고 있다가 한꺼번에 보낼 수 있는 요청 수
+POOL_SIZE = 16           # 호스트별 keep-alive 연결 수 (스캔 + 재무 + 백그라운드 스레드 합)
+TIMEOUT = 10
+MAX_RETRIES = 3
+BACKOFF_SECONDS = 0.5    # 재시도 대기: 0.5s, 1s, 2s (+ 약간의 랜덤)
+MAX_BACKOFF = 10.0
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    """초당 rate 개씩 채워지고 최대 burst 개까지 모이는 토큰. 토큰을 먼저 예약하고 잠금 밖에서 기다림"""
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """토큰 하나를 쓰고 기다린 시간(초)을 반환"""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        if wait: time.sleep(wait)
+        return wait
+
+class HttpClient:
+    """연결 풀을 공유하는 Session 하나 + 호스트별 요청 속도 제한 + 429/5xx 재시도.
+    여러 세션(가족 여러 명)이 같은 URL 을 동시에 요청하면 실제 요청은 한 번만 보내고 응답을 나눠 씀"""
+
+    def __init__(self, rate=RATE_LIMIT, burst=RATE_BURST, pool_size=POOL_SIZE, retries=MAX_RETRIES):
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.retries = retries
+        self._buckets = defaultdict(lambda: TokenBucket(rate, burst))
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _backoff(self, attempt, res=None):
+        retry_after = res.headers.get('Retry-After') if res is not None else None
+        if retry_after and retry_after.isdigit(): return min(float(retry_after), MAX_BACKOFF)
+        return min(BACKOFF_SECONDS * 2 ** attempt, MAX_BACKOFF) * random.uniform(0.8, 1.2)
+
+    def _request(self, method, stage, url, **kwargs):
+        """요청 한 건 (재시도 포함). 요청마다 지연/크기/상태를 stage 별로 기록하고 최종 오류는 예외로 올림"""
+        with self._lock:
+            bucket = self._buckets[urlparse(url).netloc]
+        for attempt in range(self.retries + 1):
+            waited = bucket.acquire()
+            if waited: metrics.observe(stage, 'rate_wait', waited)
+            start = time.perf_counter()
+            try:
+                res = self.session.request(method, url, timeout=TIMEOUT, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                metrics.record_request(stage, time.perf_counter() - start, status=599)
+                if attempt == self.retries: raise
+                metrics.record_retry(stage)
+                time.sleep(self._backoff(attempt))
+                continue
+            metrics.record_request(stage, time.perf_counter() - start, len(res.content), res.status_code)
+            if res.status_code in RETRY_STATUS and attempt < self.retries:
+                metrics.record_retry(stage)
+                time.sleep(self._backoff(attempt, res))
+                continue
+            # 오류 페이지를 '빈 페이지'로 착각해 스캔을 끝내거나 캐시하지 않도록 예외로 올림
+            res.raise_for_status()
+            return res
+
+    def get(self, stage, url, params=None, headers=None):
+        """같은 URL(+params) 요청이 이미 진행 중이면 그 응답을 기다려 같이 사용"""
+        key = (url, tuple(sorted((params or {}).items())))
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader: future = self._inflight[key] = Future()
+        if not leader:
+            metrics.record_coalesced(stage)
+            return future.result()
+        try:
+            res = self._request('GET', stage, url, params=params, headers=headers)
+            future.set_result(res)
+            return res
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def post(self, stage, url, data=None, headers=None):
+        return self._request('POST', stage, url, data=data, headers=headers)
+
+# 프로세스 전체에서 하나만 사용
+client = HttpClient()
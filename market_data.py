@@ -0,0 +1,418 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+import lxml.html
+import pandas as pd
+
+from http_client import client
+from metrics import metrics
+from store import LOCK_WAIT, FundamentalsCache, file_lock, is_market_open, last_market_close, now_kst
+
+# ---------------------------------------------------------
+# [설정] 수집 관련 상수
+# ---------------------------------------------------------
+MARKETS = {'KOSPI': 0, 'KOSDAQ': 1}   # 시장 이름 -> sosok 파라미터
+SNAPSHOT_KEY = 'KRX'     # 코스피+코스닥 통합 스냅샷 이름
+MAX_MARKET_PAGES = 100   # 페이지 바에서 마지막 페이지를 못 읽었을 때의 상한
+SCAN_WORKERS = 8         # 동시에 보낼 최대 요청 수 (너무 크면 차단될 수 있음)
+FUNDAMENTAL_WORKERS = 4  # 재무 페이지 동시 요청 수
+PRICE_WORKERS = 8        # 여러 종목 일별 시세를 동시에 받을 때의 요청 수
+MAX_DAILY_PAGES = 400
+PRICE_REFRESH_MINUTES = 30   # 이보다 최근에 저장한 일별 시세는 장중이라도 다시 받지 않음
+
+# 고정 1차 필터 (사이드바에서 바꿀 수 없는 조건)
+MIN_MARKET_CAP = 400000000000   # 시가총액 4,000억 이상
+
+# 네이버 표 제목 -> 앱에서 쓰는 컬럼명
+MARKET_COLUMNS = {
+    '종목명': 'Name', '현재가': '종가', '전일비': '전일비', '등락률': '등락률',
+    '시가총액': '시가총액', '거래량': '거래량', '거래대금': '거래대금',
+    'PER': 'PER', 'ROE': 'ROE', 'PBR': 'PBR', '배당수익률': 'DIV',
+    '영업이익': '영업이익', '외국인비율': '외국인비율'
+}
+TEXT_COLUMNS = ('Name',)   # 등락률('+1.23%')도 숫자로 읽어 둠 (화면마다 다시 파싱하지 않도록)
+
+# 메모리에 올려 둘 때의 컬럼 타입. 원 단위 금액은 float32/int32 로는 정밀도/범위가 모자라므로 int64
+COMPACT_DTYPES = {
+    'float32': ('등락률', 'PER', 'ROE', 'PBR', 'DIV', '외국인비율'),
+    'int32': ('종가', '전일비'),
+    'int64': ('시가총액', '거래량', '거래대금', '영업이익'),
+    'category': ('Name', 'Market'),
+}
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+# 벤치마크에서는 로컬 대역 서버 주소로 바꿔서 사용
+BASE_URL = os.environ.get('NAVER_BASE_URL', 'https://finance.naver.com').rstrip('/')
+
+def to_number(text):
+    s_val = text.strip().replace(',', '').replace('%', '')
+    try: return float(s_val)
+    except ValueError: return 0.0
+
+# ---------------------------------------------------------
+# [시장 스캔] 시가총액 순위 전체 페이지
+# ---------------------------------------------------------
+def parse_market_page(content):
+    """sise_market_sum 페이지의 table.type_2 를 한 번만 훑어 ([(Ticker, 값...) 행], 마지막 페이지 번호) 를 반환.
+    마지막 페이지는 페이지 바(table.Nnavi) 링크 중 가장 큰 번호. '맨뒤'(td.pgRR) 가 없는 마지막 묶음에서도
+    보이는 번호 중 가장 큰 것이 마지막 페이지임. 페이지 바가 아예 없으면 None"""
+    root = lxml.html.fromstring(content.decode('euc-kr', 'replace'))
+    pages = [int(found.group(1)) for href in root.xpath('//table[contains(@class, "Nnavi")]//a/@href')
+             for found in [re.search(r'page=(\d+)', href)] if found]
+    last_page = max(pages) if pages else None
+
+    tables = root.xpath('//table[contains(concat(" ", @class, " "), " type_2 ")]')
+    if not tables: return [], last_page
+    table = tables[0]
+
+    header_row = table.xpath('.//tr[th]')
+    if not header_row: return [], last_page
+    titles = [th.text_content().strip() for th in header_row[0].xpath('./th')]
+    # (셀 위치, 컬럼명) - 필요한 컬럼만
+    wanted = [(i, MARKET_COLUMNS[t]) for i, t in enumerate(titles) if t in MARKET_COLUMNS]
+
+    rows = []
+    for tr in table.xpath('.//tr[td/a[@class="tltle"]]'):
+        tds = tr.xpath('./td')
+        if len(tds) < len(titles): continue
+        link = tr.xpath('.//a[@class="tltle"]')[0]
+        row = {'Ticker': link.get('href').split('=')[-1]}
+        for i, col in wanted:
+            text = tds[i].text_content()
+            if col in TEXT_COLUMNS:
+                row[col] = text.strip()
+            elif col == '전일비':
+                # 하락/하한가는 화살표 이미지(blind 텍스트)로만 표시되므로 부호를 직접 붙임
+                value = to_number(re.sub(r'[^0-9.,]', '', text))
+                row[col] = -value if ('하락' in text or '하한' in text) else value
+            else:
+                row[col] = to_number(text)
+        rows.append(row)
+    return rows, last_page
+
+def fetch_market_page(sosok, page):
+    url = f"{BASE_URL}/sise/sise_market_sum.naver?sosok={sosok}&page={page}"
+    res = client.get('market_scan', url, headers=HEADERS)
+    with metrics.timer('market_scan', 'parse'):
+        return parse_market_page(res.content)
+
+def iter_market_pages(max_workers=SCAN_WORKERS, progress=None, markets=tuple(MARKETS), failed=None):
+    """코스피/코스닥 페이지를 동시에 받아 시장별로 페이지 순서대로 (시장, 행 목록) 을 내보내는 생성기.
+    progress(진행률, 표시할 글자) 는 페이지를 하나 내보낼 때마다 호출됨. 중간에 닫으면 남은 요청은 취소.
+    failed 에 dict 를 넘기면 받지 못한 페이지를 {시장: [페이지 번호]} 로 채움 (1페이지 실패는 시장 전체 누락)"""
+    failed = {} if failed is None else failed
+    url_submit = f"{BASE_URL}/sise/field_submit.naver"
+    form_data = {
+        'menu': 'market_sum',
+        'returnUrl': 'http://finance.naver.com/sise/sise_market_sum.naver',
+        'fieldIds': ['quant', 'amount', 'market_sum', 'per', 'roe', 'pbr', 'dividend_yield', 'operating_profit', 'frgn_rate']
+    }
+    # 항목 선택 쿠키는 공유 세션에 남아 이후 모든 페이지 요청(두 시장 모두)에 함께 전송됨
+    client.post('market_scan', url_submit, data=form_data, headers=HEADERS)
+
+    # 두 시장의 페이지를 한 스레드 풀(최대 max_workers개)에서 동시에 받음
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        # 1) 시장별 1페이지를 먼저 받아 페이지 바에서 전체 페이지 수를 읽음
+        first = {m: executor.submit(fetch_market_page, MARKETS[m], 1) for m in markets}
+        futures = {}
+        for m in markets:
+            try:
+                rows, last_page = first[m].result()
+            except Exception as e:
+                metrics.swallowed('market_scan', e)
+                failed.setdefault(m, []).append(1)
+                futures[m] = []
+                continue
+            # 페이지 바가 아예 없을 때만 상한까지 요청 (빈 페이지를 만나면 나머지는 취소)
+            n_pages = last_page or (MAX_MARKET_PAGES if rows else 1)
+            futures[m] = [first[m]] + [executor.submit(fetch_market_page, MARKETS[m], page)
+                                       for page in range(2, n_pages + 1)]
+
+        # 2) 빈 페이지를 만나면 그 시장의 남은 요청은 취소 (이미 보낸 요청은 기다리지 않음)
+        total, done = sum(len(f) for f in futures.values()), 0
+        for m in markets:
+            for page, future in enumerate(futures[m], start=1):
+                done += 1
+                if progress: progress(done / total, f"{m} {page}/{len(futures[m])}")
+                try:
+                    rows, _ = future.result()
+                except Exception as e:
+                    # 페이지 수를 알고 있으므로 실패한 페이지만 건너뛰고 기록해 둠
+                    metrics.swallowed('market_scan', e)
+                    failed.setdefault(m, []).append(page)
+                    continue
+                if not rows:
+                    for rest in futures[m][page:]: rest.cancel()
+                    break
+                yield m, rows
+    finally:
+        # 생성기를 끝까지 돌지 않고 닫아도(사용자가 조건을 바꿔 재실행 등) 여기서 남은 요청을 취소
+        executor.shutdown(wait=False, cancel_futures=True)
+
+def market_frame(rows, markets):
+    """파싱한 행 목록 -> 단위를 원으로 맞추고 Market 컬럼을 붙인 DataFrame (종목코드 인덱스)"""
+    if not rows: return pd.DataFrame()
+    columns = ['Ticker'] + [c for c in MARKET_COLUMNS.values() if c in rows[0]]
+    df = pd.DataFrame.from_records(rows, columns=columns).set_index('Ticker')
+    df['Market'] = markets
+    # 같은 종목이 두 시장에 걸쳐 나오는 경우(스캔 중 이전상장 등)는 먼저 나온 쪽만 사용
+    df = df[~df.index.duplicated()]
+
+    df['시가총액'] *= 100000000
+    df['거래대금'] *= 1000000
+    df['영업이익'] *= 100000000
+    return compact_frame(df)
+
+def compact_frame(df):
+    """COMPACT_DTYPES 로 타입을 줄인 DataFrame. 등락률이 문자열로 저장된 예전 스냅샷도 여기서 숫자로 바꿈"""
+    if df.empty: return df
+    if '등락률' in df and not pd.api.types.is_numeric_dtype(df['등락률']):
+        df = df.assign(등락률=pd.to_numeric(df['등락률'].astype(str).str.replace(r'[%+,]', '', regex=True), errors='coerce'))
+    dtypes = {col: dtype for dtype, cols in COMPACT_DTYPES.items() for col in cols if col in df}
+    # 정수로 바꿀 컬럼은 NaN 을 0 으로 (to_number 와 같은 규칙)
+    df = df.assign(**{col: df[col].fillna(0).round() for col, dtype in dtypes.items()
+                      if dtype.startswith('int') and df[col].dtype.kind == 'f'})
+    return df.astype(dtypes)
+
+def scan_naver_market(max_workers=SCAN_WORKERS, progress=None, markets=tuple(MARKETS), failed=None):
+    """코스피/코스닥 전체를 스캔해 Market 컬럼을 붙인 한 DataFrame 으로 반환 (failed 는 iter_market_pages 와 같음)"""
+    all_rows, row_markets = [], []
+    for m, rows in iter_market_pages(max_workers, progress, markets, failed):
+        all_rows.extend(rows)
+        row_markets.extend([m] * len(rows))
+    # 페이지마다 concat 하지 않고 마지막에 한 번만 DataFrame 생성
+    return market_frame(all_rows, row_markets)
+
+def wait_notice(progress):
+    """다른 워커의 스캔을 기다리는 동안 진행 표시에 알림 (Streamlit 은 이 호출 때 재실행 요청을 받아 중단할 수 있음)"""
+    if progress is None: return None
+    return lambda waited_s: progress(min(waited_s / LOCK_WAIT.total_seconds(), 1.0),
+                                     f"다른 스캔이 끝나기를 기다리는 중... ({waited_s:.0f}초)")
+
+def snapshot_after_wait(store, lock, refresh=False):
+    """스캔 잠금을 기다린 뒤 쓸 스냅샷. 기다리는 동안 다른 워커가 저장했으면 그것,
+    잠금을 끝내 못 얻었으면 마지막 스냅샷(오래됐더라도). 없으면 None (직접 스캔)"""
+    df_cached = None
+    if lock.waited and not refresh: df_cached, _ = store.load(SNAPSHOT_KEY)
+    if df_cached is None and not lock.acquired:
+        metrics.swallowed('market_scan', TimeoutError(lock.path))
+        df_cached, _ = store.load(SNAPSHOT_KEY, fresh_only=False)
+    return df_cached
+
+def load_market_data(store, max_workers=SCAN_WORKERS, progress=None, refresh=False):
+    """디스크 스냅샷이 아직 유효하면 그대로, 아니면(또는 refresh 면) 새로 스캔해서 저장.
+    백그라운드 갱신 등 다른 워커가 스캔 중이면 끝날 때까지(최대 LOCK_WAIT) 기다렸다가 그 스냅샷을 씀"""
+    df_cached, _ = (None, None) if refresh else store.load(SNAPSHOT_KEY)
+    if df_cached is None:
+        with file_lock(store.lock_path(SNAPSHOT_KEY), on_wait=wait_notice(progress)) as lock:
+            df_cached = snapshot_after_wait(store, lock, refresh)
+            if df_cached is None:
+                metrics.cache('market_scan', misses=True)
+                failed = {}
+                with metrics.timer('market_scan', 'scan'):
+                    df_final = scan_naver_market(max_workers, progress, failed=failed)
+                # 빠진 페이지가 있으면 이번 결과만 쓰고 스냅샷으로 남기지 않음 (다음 요청 때 다시 스캔)
+                if not df_final.empty and not failed:
+                    try: store.save(SNAPSHOT_KEY, df_final)
+                    except OSError as e: metrics.swallowed('market_scan', e)   # 저장 실패해도 이번 결과는 그대로 사용
+                return df_final
+    metrics.cache('market_scan', hits=True)
+    return compact_frame(df_cached)
+
+def stream_market_data(store, max_workers=SCAN_WORKERS, progress=None, failed=None):
+    """load_market_data 의 생성기 버전: 유효한 스냅샷이 있으면 통째로 한 번, 없으면 스캔하면서 페이지별 DataFrame 을 내보냄.
+    끝까지, 빠진 페이지 없이 받았을 때만 스냅샷으로 저장 (failed 는 iter_market_pages 와 같음).
+    다른 워커가 스캔 중이면 기다렸다가 그 스냅샷을 씀"""
+    df_cached, _ = store.load(SNAPSHOT_KEY)
+    if df_cached is None:
+        with file_lock(store.lock_path(SNAPSHOT_KEY), on_wait=wait_notice(progress)) as lock:
+            df_cached = snapshot_after_wait(store, lock)
+            if df_cached is None:
+                metrics.cache('market_scan', misses=True)
+                yield from scan_frames(store, max_workers, progress, failed)
+                return
+    metrics.cache('market_scan', hits=True)
+    yield compact_frame(df_cached)
+
+def scan_frames(store, max_workers, progress, failed=None):
+    """스캔하면서 페이지별 DataFrame 을 내보내고, 빠진 페이지 없이 끝나면 스냅샷으로 저장 (스캔 잠금 안에서 호출)"""
+    frames, failed = [], {} if failed is None else failed
+    for m, rows in iter_market_pages(max_workers, progress, failed=failed):
+        frames.append(market_frame(rows, [m] * len(rows)))
+        yield frames[-1]
+    if frames and not failed:
+        df_final = concat_frames(frames)
+        try: store.save(SNAPSHOT_KEY, df_final)
+        except OSError as e: metrics.swallowed('market_scan', e)
+
+def concat_frames(frames):
+    """stream_market_data 가 내보낸 페이지별 DataFrame -> 시장 전체 DataFrame"""
+    # 페이지마다 category 값이 달라 합치면 일반 문자열이 되므로 다시 줄임
+    df_all = compact_frame(pd.concat(frames))
+    return df_all[~df_all.index.duplicated()]
+
+def prescreen(df_all):
+    """사용자 설정과 무관한 고정 조건 (시총 4,000억 이상, 영업이익 흑자)"""
+    return df_all[(df_all['시가총액'] >= MIN_MARKET_CAP) & (df_all['영업이익'] > 0)]
+
+# ---------------------------------------------------------
+# [재무] 부채비율 등 재무비율
+# ---------------------------------------------------------
+def parse_fundamentals(content):
+    """item/main 페이지의 '주요재무정보' 표에서 부채비율 등 비율 행만 바로 찾아 최근 값과 결산 기간을 반환"""
+    root = lxml.html.fromstring(content.decode('euc-kr', 'replace'))
+    record = {}
+    for name in FundamentalsCache.RATIOS:
+        ths = root.xpath(f'//table//tbody/tr/th[normalize-space()="{name}"]')
+        if not ths: continue
+        tr = ths[0].getparent()
+        values = [to_number(td.text_content()) if re.search(r'\d', td.text_content()) else None for td in tr.xpath('./td')]
+        # 가장 최근(오른쪽) 값 사용
+        filled = [(i, v) for i, v in enumerate(values) if v is not None]
+        if not filled: continue
+        idx, record[name] = filled[-1]
+        if name == '부채비율':
+            periods = tr.xpath('ancestor::table[1]/thead/tr[2]/th')
+            if idx < len(periods):
+                record['period'] = re.sub(r'[^0-9.]', '', periods[idx].text_content())[:7]
+    return record
+
+def fetch_fundamentals(ticker):
+    url = f"{BASE_URL}/item/main.naver?code={ticker}"
+    res = client.get('fundamentals', url, headers=HEADERS)
+    with metrics.timer('fundamentals', 'parse'):
+        return parse_fundamentals(res.content)
+
+def get_debt_ratios(tickers, cache, max_workers=FUNDAMENTAL_WORKERS, progress=None):
+    """{종목코드: 부채비율}. 캐시에 없는 종목만 동시에 받아오고, 못 구한 종목은 NaN"""
+    tickers = list(tickers)
+    cached = cache.get_many(tickers)
+    debt_ratios = cached['부채비율'].to_dict()
+    missing = [t for t in tickers if t not in debt_ratios]
+    metrics.cache('fundamentals', hits=len(debt_ratios), misses=len(missing))
+    if not missing: return debt_ratios
+
+    fetched = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fetch_fundamentals, t): t for t in missing}
+        for i, future in enumerate(as_completed(futures)):
+            ticker = futures[future]
+            if progress: progress((i + 1) / len(missing), ticker)
+            try: fetched[ticker] = future.result()
+            except Exception as e:
+                metrics.swallowed('fundamentals', e)   # 요청 실패는 캐시하지 않고 다음에 다시 시도
+
+    try: cache.put_many(fetched)
+    except OSError as e: metrics.swallowed('fundamentals', e)
+    for ticker, record in fetched.items():
+        debt_ratios[ticker] = record.get('부채비율', float('nan'))
+    return debt_ratios
+
+# ---------------------------------------------------------
+# [시세] 일별 종가 이력
+# ---------------------------------------------------------
+def parse_daily_page(content):
+    """sise_day 페이지에서 (날짜, 종가) 를 뽑아 한 번에 변환"""
+    root = lxml.html.fromstring(content.decode('euc-kr', 'replace'))
+    dates, closes = [], []
+    for tr in root.xpath('//table[contains(@class, "type2")]//tr[td]'):
+        tds = tr.xpath('./td')
+        if len(tds) < 2: continue
+        date_text = tds[0].text_content().strip()
+        if not re.match(r'\d{4}\.\d{2}\.\d{2}$', date_text): continue
+        dates.append(date_text)
+        closes.append(tds[1].text_content().strip())
+    return pd.DataFrame({
+        'Date': pd.to_datetime(pd.Series(dates, dtype=object), format='%Y.%m.%d'),
+        'Close': pd.to_numeric(pd.Series(closes, dtype=object).str.replace(',', ''), errors='coerce'),
+    }).dropna()
+
+def fetch_daily_history(ticker, since):
+    """since 이후의 일별 종가를 최신 페이지부터 거꾸로 받아 (DataFrame, 끝까지 받았는지) 를 반환.
+    중간 페이지 요청이 실패하면 받은 데까지만 돌려주고 complete=False"""
+    url_sise = f"{BASE_URL}/item/sise_day.naver"
+    frames = []
+    oldest = None
+    complete = False
+
+    for page in range(1, MAX_DAILY_PAGES + 1):
+        try:
+            res = client.get('daily_prices', url_sise, params={'code': ticker, 'page': page}, headers=HEADERS)
+            with metrics.timer('daily_prices', 'parse'):
+                df = parse_daily_page(res.content)
+        except Exception as e:
+            metrics.swallowed('daily_prices', e)
+            break
+        # 빈 페이지, 또는 마지막 페이지를 넘겨 같은 페이지를 다시 받으면 상장일까지 다 받은 것
+        if df.empty or (oldest is not None and df['Date'].min() >= oldest):
+            complete = True
+            break
+        oldest = df['Date'].min()
+        frames.append(df[df['Date'] >= since])
+        if oldest < since:
+            complete = True
+            break
+
+    if not frames: return pd.DataFrame(columns=['Close'], index=pd.DatetimeIndex([], name='Date')), complete
+    df_price = pd.concat(frames).drop_duplicates('Date').set_index('Date').sort_index()
+    df_price['Close'] = df_price['Close'].astype('int64')
+    return df_price, complete
+
+def load_daily_history(ticker, store, days=1825):
+    """저장된 이력에 새로 생긴 날짜만 받아 붙인 뒤 최근 days 일을 반환"""
+    target_date = pd.Timestamp(datetime.now() - timedelta(days=days)).normalize()
+    stored, saved_at, since = store.load(ticker)
+
+    if stored.empty or since is None or since > target_date:
+        # 처음 보는 종목(또는 저장된 기간이 모자람): 전체 기간을 받음
+        metrics.cache('daily_prices', misses=1)
+        df_price, complete = fetch_daily_history(ticker, target_date)
+        if df_price.empty: return stored[stored.index >= target_date] if not stored.empty else df_price
+        if complete:
+            if not stored.empty:
+                df_price = pd.concat([stored[stored.index < df_price.index.min()], df_price])
+            since = min(since, target_date) if since is not None else target_date
+        elif not stored.empty and since is not None and df_price.index.min() <= stored.index.max():
+            # 중간에 실패했지만 저장된 이력과 이어지면 저장된 시작일은 그대로 유효
+            df_price = pd.concat([stored[stored.index < df_price.index.min()], df_price])
+        else:
+            # 받은 데까지만 완전하다고 기록 -> 다음에 다시 전체 기간을 받음
+            since = df_price.index.min()
+    elif saved_at >= now_kst() - timedelta(minutes=PRICE_REFRESH_MINUTES) or \
+            (not is_market_open() and saved_at >= last_market_close(now_kst())):
+        # 방금 저장했거나 장 마감 후에 이미 저장했다면 새로 받을 게 없음
+        metrics.cache('daily_prices', hits=1)
+        return stored[stored.index >= target_date]
+    else:
+        # 마지막 저장일 이후 페이지만 받음 (마지막 날짜는 장중 값일 수 있어 다시 받음)
+        metrics.cache('daily_prices', hits=1)
+        new, complete = fetch_daily_history(ticker, stored.index.max())
+        # 중간에 실패하면 저장된 이력과의 사이가 비므로 저장하지 않고 다음에 다시 받음
+        if not complete: return stored[stored.index >= target_date]
+        df_price = pd.concat([stored[stored.index < new.index.min()], new]) if not new.empty else stored
+
+    if not df_price.empty:
+        try: store.save(ticker, df_price, since)
+        except OSError as e: metrics.swallowed('daily_prices', e)
+    return df_price[df_price.index >= target_date]
+
+def load_price_panel(tickers, store, days=1825, max_workers=PRICE_WORKERS, progress=None):
+    """여러 종목의 일별 종가를 동시에 받아 (날짜 x 종목코드) 한 표로 합침. 저장된 이력은 그대로 재사용.
+    progress(진행률, 종목코드) 는 종목 하나를 받을 때마다 호출됨"""
+    tickers = list(tickers)
+    closes = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(load_daily_history, t, store, days): t for t in tickers}
+        for i, future in enumerate(as_completed(futures)):
+            ticker = futures[future]
+            if progress: progress((i + 1) / len(tickers), ticker)
+            try: df = future.result()
+            except Exception as e:
+                metrics.swallowed('daily_prices', e)
+                continue
+            if not df.empty: closes[ticker] = df['Close']
+    if not closes: return pd.DataFrame(index=pd.DatetimeIndex([], name='Date'))
+    return pd.DataFrame(closes).sort_index().astype('float64')
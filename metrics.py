@@ -0,0 +1,174 @@
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+# ---------------------------------------------------------
+# [계측] 프로세스 전체에서 공유하는 요청/파싱/캐시/예외 지표
+# ---------------------------------------------------------
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.n = 0
+
+    def observe(self, value):
+        self.n += 1
+        self.total += value
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                self.counts[i] += 1
+                break
+
+    def quantile(self, q):
+        """버킷 상한으로 근사한 분위수"""
+        if not self.n: return 0.0
+        target, seen = q * self.n, 0
+        for upper, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target: return upper
+        return self.buckets[-1]
+
+class Metrics:
+    """단계(stage)별: 요청 수/오류/바이트/지연 분포, 파싱 시간, 캐시 적중/누락, 삼킨 예외 수"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.requests = defaultdict(int)
+            self.http_errors = defaultdict(int)
+            self.retries = defaultdict(int)
+            self.coalesced = defaultdict(int)         # 진행 중인 같은 요청에 합쳐진 횟수
+            self.bytes = defaultdict(int)
+            self.latency = defaultdict(Histogram)
+            self.durations = defaultdict(Histogram)   # (stage, 구간이름) -> 소요 시간
+            self.cache_hits = defaultdict(int)
+            self.cache_misses = defaultdict(int)
+            self.exceptions = defaultdict(int)        # (stage, 예외 타입) -> 횟수
+
+    def record_request(self, stage, seconds, nbytes=0, status=200):
+        with self._lock:
+            self.requests[stage] += 1
+            self.bytes[stage] += nbytes
+            self.latency[stage].observe(seconds)
+            if status >= 400: self.http_errors[stage] += 1
+
+    def record_retry(self, stage):
+        with self._lock:
+            self.retries[stage] += 1
+
+    def record_coalesced(self, stage):
+        with self._lock:
+            self.coalesced[stage] += 1
+
+    def observe(self, stage, name, seconds):
+        with self._lock:
+            self.durations[(stage, name)].observe(seconds)
+
+    @contextmanager
+    def timer(self, stage, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, name, time.perf_counter() - start)
+
+    def cache(self, stage, hits=0, misses=0):
+        with self._lock:
+            self.cache_hits[stage] += hits
+            self.cache_misses[stage] += misses
+
+    def swallowed(self, stage, exc):
+        """except 로 삼키고 넘어가는 예외를 타입별로 셈"""
+        with self._lock:
+            self.exceptions[(stage, type(exc).__name__)] += 1
+
+    # -----------------------------------------------------
+    # 내보내기
+    # -----------------------------------------------------
+    def snapshot(self):
+        """JSON 으로 바로 내보낼 수 있는 dict"""
+        with self._lock:
+            stages = set(self.requests) | set(self.coalesced) | set(self.cache_hits) | set(self.cache_misses) | {s for s, _ in self.durations}
+            out = {'uptime_s': round(time.time() - self.started_at, 1), 'stages': {}, 'exceptions': []}
+            for stage in sorted(stages):
+                lat = self.latency.get(stage)
+                hits, misses = self.cache_hits.get(stage, 0), self.cache_misses.get(stage, 0)
+                out['stages'][stage] = {
+                    'requests': self.requests.get(stage, 0),
+                    'http_errors': self.http_errors.get(stage, 0),
+                    'retries': self.retries.get(stage, 0),
+                    'coalesced': self.coalesced.get(stage, 0),
+                    'bytes': self.bytes.get(stage, 0),
+                    'latency_avg_s': round(lat.total / lat.n, 4) if lat and lat.n else 0.0,
+                    'latency_p95_s': lat.quantile(0.95) if lat else 0.0,
+                    'cache_hits': hits,
+                    'cache_misses': misses,
+                    'cache_hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+                    'timings': {name: {'count': h.n, 'total_s': round(h.total, 4)}
+                                for (s, name), h in self.durations.items() if s == stage},
+                }
+            out['exceptions'] = [{'stage': s, 'type': t, 'count': c} for (s, t), c in sorted(self.exceptions.items())]
+            return out
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), ensure_ascii=False, indent=2)
+
+    def to_prometheus(self):
+        """Prometheus text exposition format"""
+        lines = []
+        def metric(name, kind, help_text):
+            lines.append(f"# HELP stock_{name} {help_text}")
+            lines.append(f"# TYPE stock_{name} {kind}")
+        with self._lock:
+            metric('http_requests_total', 'counter', 'HTTP requests to Naver by stage')
+            lines += [f'stock_http_requests_total{{stage="{s}"}} {v}' for s, v in sorted(self.requests.items())]
+            metric('http_errors_total', 'counter', 'HTTP responses with status >= 400')
+            lines += [f'stock_http_errors_total{{stage="{s}"}} {v}' for s, v in sorted(self.http_errors.items())]
+            metric('http_retries_total', 'counter', 'Requests retried after 429/5xx or a connection error')
+            lines += [f'stock_http_retries_total{{stage="{s}"}} {v}' for s, v in sorted(self.retries.items())]
+            metric('http_coalesced_total', 'counter', 'Requests served by an identical in-flight request')
+            lines += [f'stock_http_coalesced_total{{stage="{s}"}} {v}' for s, v in sorted(self.coalesced.items())]
+            metric('http_response_bytes_total', 'counter', 'Response body bytes')
+            lines += [f'stock_http_response_bytes_total{{stage="{s}"}} {v}' for s, v in sorted(self.bytes.items())]
+            metric('http_request_duration_seconds', 'histogram', 'HTTP request latency')
+            for stage, h in sorted(self.latency.items()):
+                cumulative = 0
+                for upper, count in zip(h.buckets, h.counts):
+                    cumulative += count
+                    le = '+Inf' if upper == float('inf') else upper
+                    lines.append(f'stock_http_request_duration_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'stock_http_request_duration_seconds_sum{{stage="{stage}"}} {h.total:.6f}')
+                lines.append(f'stock_http_request_duration_seconds_count{{stage="{stage}"}} {h.n}')
+            metric('stage_duration_seconds', 'summary', 'Time spent in parse/compute steps')
+            for (stage, name), h in sorted(self.durations.items()):
+                lines.append(f'stock_stage_duration_seconds_sum{{stage="{stage}",step="{name}"}} {h.total:.6f}')
+                lines.append(f'stock_stage_duration_seconds_count{{stage="{stage}",step="{name}"}} {h.n}')
+            metric('cache_hits_total', 'counter', 'Cache hits by stage')
+            lines += [f'stock_cache_hits_total{{stage="{s}"}} {v}' for s, v in sorted(self.cache_hits.items())]
+            metric('cache_misses_total', 'counter', 'Cache misses by stage')
+            lines += [f'stock_cache_misses_total{{stage="{s}"}} {v}' for s, v in sorted(self.cache_misses.items())]
+            metric('swallowed_exceptions_total', 'counter', 'Exceptions caught and ignored')
+            lines += [f'stock_swallowed_exceptions_total{{stage="{s}",type="{t}"}} {v}'
+                      for (s, t), v in sorted(self.exceptions.items())]
+        return '\n'.join(lines) + '\n'
+
+    def write_files(self, directory):
+        """node_exporter textfile collector 등이 긁어 갈 수 있도록 metrics.prom / metrics.json 저장"""
+        # store 는 pandas/pyarrow 를 불러오므로 필요할 때만 (로그인 화면이 metrics 만 쓰므로)
+        from store import atomic_write
+        prom, js = self.to_prometheus().encode(), self.to_json().encode()
+        atomic_write(os.path.join(directory, 'metrics.prom'), lambda f: f.write(prom))
+        atomic_write(os.path.join(directory, 'metrics.json'), lambda f: f.write(js))
+
+# 프로세스 전체에서 하나만 사용
+metrics = Metrics()
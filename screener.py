@@ -0,0 +1,300 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from market_data import (FUNDAMENTAL_WORKERS, SCAN_WORKERS, compact_frame, get_debt_ratios, load_market_data,
+                         load_price_panel, prescreen)
+from signals import SIGNAL_COLUMNS, SIGNAL_DAYS, technical_signals
+from metrics import metrics
+from store import trading_day
+
+# ---------------------------------------------------------
+# [기본 조건] 앱 사이드바와 CLI 가 같이 쓰는 기본값
+# ---------------------------------------------------------
+DEFAULT_EXCLUDE = '은행|HDC|페인트|코리안리|지주|홀딩스|금융|증권|카드|공사|한국전력|한전KPS|강원랜드|자산|보험|레저|스팩|리츠|생명|해상|화재|시멘트'
+DEFAULTS = {'max_per': 10.0, 'max_pbr': 1.0, 'min_roe': 10.0, 'max_debt': 200.0,
+            'min_foreign': 5.0, 'min_amt': 300000000, 'exclude': DEFAULT_EXCLUDE}
+
+# ---------------------------------------------------------
+# [검색 엔진] 한 스냅샷 위에서 슬라이더 조건을 즉시 계산
+# ---------------------------------------------------------
+def cast_like(values, x):
+    """float32 컬럼과 비교할 기준값은 같은 타입으로 (PBR 0.3 이 float32 로 0.30000001 이 되어 '<= 0.3' 에서 빠지지 않도록)"""
+    return values.dtype.type(x) if values.dtype.kind == 'f' else x
+
+class SignalCache:
+    """종목별 기술적 지표를 거래일 단위로 보관. 지표는 스냅샷이 아니라 일별 시세로 계산하므로
+    장중 새 스냅샷으로 검색 엔진을 다시 만들어도 같은 거래일이면 그대로 씀 (거래일이 바뀌면 비움)"""
+
+    def __init__(self):
+        self.day = None
+        self._df = pd.DataFrame(columns=SIGNAL_COLUMNS, dtype='float64')
+        self._lock = threading.Lock()
+
+    def _current(self, day):
+        if day != self.day:
+            self.day = day
+            self._df = self._df.iloc[0:0]
+        return self._df
+
+    def get(self, day=None):
+        with self._lock:
+            return self._current(day or trading_day())
+
+    def missing(self, tickers, day=None):
+        known = self.get(day).index
+        return [t for t in tickers if t not in known]
+
+    def put(self, df_signals, day=None):
+        """새로 계산한 지표를 반영 (이력이 없어 NaN 인 종목도 계산한 것으로 봄)"""
+        with self._lock:
+            df = self._current(day or trading_day())
+            self._df = pd.concat([df[~df.index.isin(df_signals.index)], df_signals.reindex(columns=SIGNAL_COLUMNS)])
+
+class Screener:
+    """지표별로 정렬해 둔 값(searchsorted 로 구간 검색) + 제외 키워드 마스크 캐시 + 조건별 결과 메모.
+    같은 스냅샷을 쓰는 동안에는 네트워크 없이 조건만 바꿔 다시 계산할 수 있음.
+    스냅샷 DataFrame 은 모든 세션이 같이 읽기만 하고, 메모와 세션에는 그 안의 행 번호만 남김"""
+
+    METRICS = ('거래대금', 'PBR', 'PER', 'ROE', '외국인비율')
+
+    def __init__(self, df_all, debt_ratios=None, memo_size=256, signal_cache=None):
+        self.df = compact_frame(df_all)
+        self.memo_size = memo_size
+        # 시총/영업이익 조건은 고정이므로 한 번만 계산
+        self._base = self.df.index.isin(prescreen(self.df).index)
+        self._cap = self.df['시가총액'].to_numpy()
+        self._sorted = {}
+        for col in self.METRICS:
+            values = self.df[col].to_numpy()
+            order = np.argsort(values, kind='stable')
+            self._sorted[col] = (values[order], order)
+        self._keyword_masks = OrderedDict()
+        self._results = OrderedDict()
+        # 부채비율 행이 없던 종목(NaN)은 원래처럼 9999 로 보고 제외, 아예 모르는 종목은 인덱스에 없음
+        self._debt = pd.Series(debt_ratios if debt_ratios is not None else {}, dtype='float64').fillna(9999.0)
+        # 기술적 지표는 버튼을 눌렀을 때만 계산해 쌓아 둠 (슬라이더 재실행에서는 읽기만 함).
+        # 스냅샷이 바뀌어도 이어 쓰도록 앱에서는 프로세스 전체가 같이 쓰는 캐시를 넘김
+        self.signal_cache = signal_cache if signal_cache is not None else SignalCache()
+        self._lock = threading.Lock()
+
+    def _range(self, col, lo=-np.inf, hi=np.inf, lo_open=False):
+        """lo <= 값 <= hi (lo_open 이면 lo < 값) 인 행의 마스크"""
+        values, order = self._sorted[col]
+        start = np.searchsorted(values, cast_like(values, lo), side='right' if lo_open else 'left')
+        end = np.searchsorted(values, cast_like(values, hi), side='right')
+        mask = np.zeros(len(values), dtype=bool)
+        mask[order[start:end]] = True
+        return mask
+
+    def _keyword_mask(self, exclude):
+        mask = self._keyword_masks.get(exclude)
+        if mask is None:
+            mask = ~self.df['Name'].str.contains(exclude).to_numpy(dtype=bool) if exclude else np.ones(len(self.df), dtype=bool)
+            self._keyword_masks[exclude] = mask
+            if len(self._keyword_masks) > 16: self._keyword_masks.popitem(last=False)
+        return mask
+
+    def _memo(self, key, compute):
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                metrics.cache('screen', hits=1)
+                return self._results[key]
+        metrics.cache('screen', misses=1)
+        with metrics.timer('screen', key[0]):
+            result = compute()
+        with self._lock:
+            self._results[key] = result
+            if len(self._results) > self.memo_size: self._results.popitem(last=False)
+        return result
+
+    def candidate_rows(self, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude):
+        """1차 필터(부채비율 제외)를 통과한 행 번호"""
+        def compute():
+            mask = (self._base
+                    & self._range('거래대금', lo=min_amt)
+                    & self._range('PBR', lo=0, hi=max_pbr, lo_open=True)
+                    & self._range('PER', lo=0, hi=max_per, lo_open=True)
+                    & self._range('ROE', lo=min_roe)
+                    & self._range('외국인비율', lo=min_foreign)
+                    & self._keyword_mask(exclude))
+            return np.flatnonzero(mask)
+        return self._memo(('candidates', max_per, max_pbr, min_roe, min_foreign, min_amt, exclude), compute)
+
+    def candidates(self, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude):
+        """1차 필터(부채비율 제외)를 통과한 종목 DataFrame"""
+        return self.df.iloc[self.candidate_rows(max_per, max_pbr, min_roe, min_foreign, min_amt, exclude)]
+
+    def set_debt_ratios(self, debt_ratios):
+        """새로 받은 부채비율을 반영 (이전 결과 메모는 비움)"""
+        with self._lock:
+            new = pd.Series(debt_ratios, dtype='float64').fillna(9999.0)
+            self._debt = pd.concat([self._debt[~self._debt.index.isin(new.index)], new])
+            self._results = OrderedDict((k, v) for k, v in self._results.items() if k[0] == 'candidates')
+
+    def missing_debt(self, tickers):
+        return [t for t in tickers if t not in self._debt.index]
+
+    def fetch_missing_debt(self, cache, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude,
+                           max_workers=FUNDAMENTAL_WORKERS, progress=None):
+        """1차 필터를 통과했지만 부채비율을 아직 모르는 종목만 받아서 반영. 받으려고 한 종목 수를 반환"""
+        missing = self.missing_debt(self.candidates(max_per, max_pbr, min_roe, min_foreign, min_amt, exclude).index)
+        if missing: self.set_debt_ratios(get_debt_ratios(missing, cache, max_workers, progress))
+        return len(missing)
+
+    def missing_signals(self, tickers):
+        return self.signal_cache.missing(tickers)
+
+    def set_signals(self, df_signals):
+        """새로 계산한 기술적 지표를 반영 (이력이 없어 NaN 인 종목도 계산한 것으로 봄)"""
+        self.signal_cache.put(df_signals)
+
+    def fetch_missing_signals(self, price_store, tickers, progress=None):
+        """tickers 중 지표를 아직 계산하지 않은 종목만 일별 시세를 받아 계산. 계산한 종목 수를 반환"""
+        missing = self.missing_signals(tickers)
+        if missing:
+            panel = load_price_panel(missing, price_store, SIGNAL_DAYS, progress=progress)
+            self.set_signals(technical_signals(panel).reindex(missing))
+        return len(missing)
+
+    def failed_conditions(self, tickers, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude, max_debt):
+        """종목별로 통과하지 못한 조건 이름 (', ' 로 연결). 결과에서 빠진 이유를 보여줄 때 사용"""
+        checks = {
+            '시총/흑자': self._base,
+            '거래대금': self._range('거래대금', lo=min_amt),
+            'PBR': self._range('PBR', lo=0, hi=max_pbr, lo_open=True),
+            'PER': self._range('PER', lo=0, hi=max_per, lo_open=True),
+            'ROE': self._range('ROE', lo=min_roe),
+            '외국인비율': self._range('외국인비율', lo=min_foreign),
+            '제외 키워드': self._keyword_mask(exclude),
+        }
+        tickers = list(tickers)
+        debt = self._debt.reindex(tickers).to_numpy()
+        reasons = []
+        for i, d in zip(self.df.index.get_indexer(tickers), debt):
+            if i < 0:
+                reasons.append('스냅샷에 없음')   # 상장폐지/거래정지 등
+                continue
+            failed = [name for name, mask in checks.items() if not mask[i]]
+            if np.isnan(d): failed.append('부채비율 미확인')
+            elif d > max_debt: failed.append('부채비율')
+            reasons.append(', '.join(failed))
+        return pd.Series(reasons, index=tickers, dtype=object)
+
+    def screen_rows(self, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude, max_debt):
+        """부채비율까지 통과한 행 번호 (시가총액 큰 순). 부채비율을 아직 모르는 종목은 빠짐"""
+        params = (max_per, max_pbr, min_roe, min_foreign, min_amt, exclude)
+
+        def compute():
+            rows = self.candidate_rows(*params)
+            debt = self._debt.reindex(self.df.index[rows]).to_numpy()
+            with np.errstate(invalid='ignore'):
+                rows = rows[debt <= max_debt]   # NaN(모르는 종목)은 여기서 빠짐
+            return rows[np.argsort(-self._cap[rows], kind='stable')]
+        return self._memo(('screen',) + params + (max_debt,), compute)
+
+    def frame(self, rows):
+        """행 번호 -> 부채비율 컬럼을 붙인 결과 DataFrame (화면에 그릴 때마다 필요한 만큼만 만듦)"""
+        df = self.df.iloc[rows]
+        df = df.assign(부채비율=self._debt.reindex(df.index).to_numpy())
+        df_signals = self.signal_cache.get()
+        if df_signals.empty: return df
+        # 지표를 계산한 적이 있으면 컬럼을 붙임 (아직 계산하지 않은 종목은 NaN)
+        return df.join(df_signals)
+
+    def screen(self, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude, max_debt):
+        """부채비율까지 적용해 시가총액 순으로 정렬한 최종 결과"""
+        return self.frame(self.screen_rows(max_per, max_pbr, min_roe, min_foreign, min_amt, exclude, max_debt))
+
+# ---------------------------------------------------------
+# [스트리밍] 스캔이 끝나기 전부터 조건을 통과한 종목을 차례로 내보냄
+# ---------------------------------------------------------
+DEBT_BATCH = 20   # 부채비율을 한 번에 확인할 종목 수 (이만큼씩 결과가 늘어남)
+
+def candidate_mask(df, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude):
+    """Screener.candidates 와 같은 조건을 스냅샷 일부(페이지 하나 등)에 바로 적용한 마스크"""
+    v = {col: df[col].to_numpy() for col in Screener.METRICS}
+    mask = (df.index.isin(prescreen(df).index)
+            & (v['거래대금'] >= cast_like(v['거래대금'], min_amt))
+            & (v['PBR'] > 0) & (v['PBR'] <= cast_like(v['PBR'], max_pbr))
+            & (v['PER'] > 0) & (v['PER'] <= cast_like(v['PER'], max_per))
+            & (v['ROE'] >= cast_like(v['ROE'], min_roe))
+            & (v['외국인비율'] >= cast_like(v['외국인비율'], min_foreign)))
+    if exclude: mask &= ~df['Name'].str.contains(exclude).to_numpy(dtype=bool)
+    return mask
+
+def stream_screen(frames, cache, max_debt, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude,
+                  max_workers=FUNDAMENTAL_WORKERS, progress=None):
+    """페이지별 DataFrame -> 1차 필터 -> 부채비율 확인 순으로 이어지는 생성기.
+    부채비율까지 통과한 종목을 DEBT_BATCH 개씩 확인되는 대로 (부채비율 컬럼을 붙여) 내보냄.
+    progress(진행률, 종목명) 는 재무 페이지를 하나 받을 때마다 호출됨"""
+    for df in frames:
+        df_candidates = df[candidate_mask(df, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude)]
+        for start in range(0, len(df_candidates), DEBT_BATCH):
+            batch = df_candidates.iloc[start:start + DEBT_BATCH]
+            ratios = get_debt_ratios(batch.index, cache, max_workers,
+                                     progress and (lambda fraction, ticker: progress(fraction, batch.at[ticker, 'Name'])))
+            debt = pd.Series(ratios, dtype='float64').reindex(batch.index).fillna(9999.0)
+            found = batch.assign(부채비율=debt)[debt.to_numpy() <= max_debt]
+            if not found.empty: yield found
+
+# ---------------------------------------------------------
+# [일괄 실행] 버튼 한 번에 해당하는 전체 흐름 (CLI/cron 용, Streamlit 불필요)
+# ---------------------------------------------------------
+def run_screen(store, cache, max_per, max_pbr, min_roe, min_foreign, min_amt, exclude, max_debt,
+               refresh=False, max_workers=SCAN_WORKERS, progress=None):
+    """스냅샷(오래됐거나 refresh 면 새로 스캔) -> 1차 필터 -> 모르는 부채비율만 받기 -> 시가총액 순 최종 결과"""
+    df_all = load_market_data(store, max_workers, progress, refresh)
+    if df_all.empty: return df_all
+    screener = Screener(df_all, cache.get_many(df_all.index)['부채비율'])
+    params = (max_per, max_pbr, min_roe, min_foreign, min_amt, exclude)
+    screener.fetch_missing_debt(cache, *params, progress=progress)
+    return screener.screen(*params, max_debt)
+
+def result_table(df_res):
+    """결과 DataFrame -> 화면/CSV 용 표 (억 단위, 한글 컬럼명)"""
+    cols_show = ['Name', 'Market', '종가', '등락률', '시가총액', 'PER', 'ROE', 'PBR', '부채비율', '외국인비율']
+    col_names = ['종목명', '시장', '현재가', '등락률', '시총(억)', 'PER', 'ROE', 'PBR', '부채(%)', '외인(%)']
+    if 'MA240이격' in df_res:
+        cols_show += ['MA240이격', '고점대비', '변동성']
+        col_names += ['240일선 이격(%)', '52주 고점대비(%)', '변동성(%)']
+    # 보여줄 컬럼만 골라서 변환. float32 는 반올림해도 11.770000 처럼 보이므로 화면용으로만 float64 로
+    df_disp = df_res[cols_show].astype({c: 'float64' for c in cols_show if df_res[c].dtype == 'float32'})
+    df_disp = df_disp.assign(시가총액=df_disp['시가총액'] / 100000000).round(2)
+    df_disp.columns = col_names
+    return df_disp
+
+# ---------------------------------------------------------
+# [변화] 지난 스캔 결과와 종목코드 기준으로 비교
+# ---------------------------------------------------------
+# 지표별 '큰 변화' 기준: ('pct', 10) 은 이전 값 대비 10% 이상, ('pt', 3) 은 3%p 이상
+MOVE_THRESHOLDS = {
+    '종가': ('pct', 10.0), 'PER': ('pct', 20.0), 'PBR': ('pct', 20.0),
+    'ROE': ('pt', 3.0), '외국인비율': ('pt', 2.0), '부채비율': ('pt', 20.0),
+}
+
+def diff_results(prev, curr, thresholds=MOVE_THRESHOLDS):
+    """두 결과 DataFrame -> (새로 들어온 종목, 빠진 종목, 큰 변화 표).
+    큰 변화 표는 양쪽에 모두 있는 종목의 (Name, 지표, 이전, 현재, 변화, 단위), 현재 결과 순서대로"""
+    new = curr[~curr.index.isin(prev.index)]
+    dropped = prev[~prev.index.isin(curr.index)]
+    both = curr.index[curr.index.isin(prev.index)]
+    moves = []
+    for col, (kind, limit) in thresholds.items():
+        if col not in curr or col not in prev: continue
+        before = prev[col].reindex(both).to_numpy(dtype='float64')
+        after = curr[col].reindex(both).to_numpy(dtype='float64')
+        with np.errstate(divide='ignore', invalid='ignore'):
+            change = np.where(before != 0, (after / before - 1) * 100, np.nan) if kind == 'pct' else after - before
+        big = np.abs(change) >= limit   # NaN(값 없음, 이전 값 0)은 제외
+        moves.append(pd.DataFrame({
+            'order': np.flatnonzero(big), 'Name': curr['Name'].reindex(both).astype(str).to_numpy()[big],
+            '지표': col, '이전': before[big], '현재': after[big], '변화': change[big],
+            '단위': '%' if kind == 'pct' else '%p'}, index=both[big]))
+    columns = ['Name', '지표', '이전', '현재', '변화', '단위']
+    if not moves: return new, dropped, pd.DataFrame(columns=columns)
+    df_moves = pd.concat(moves).sort_values('order', kind='stable')
+    return new, dropped, df_moves[columns]
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+# ---------------------------------------------------------
+# [기술적 지표] 후보 종목 전체를 (날짜 x 종목) 표 하나로 한 번에 계산
+# ---------------------------------------------------------
+SIGNAL_DAYS = 400     # 240일선 + 52주 지표에 필요한 기간 (달력 기준)
+YEAR_DAYS = 252       # 52주 = 약 252 거래일
+MA_SIDES = ('상관없음', '240일선 아래', '240일선 위')
+
+SIGNAL_COLUMNS = ['MA120', 'MA240', 'MA120이격', 'MA240이격', '고점대비', '저점대비', '변동성']
+
+def moving_average(panel, window):
+    """마지막 window 거래일 평균. 이력이 window 일보다 짧은 종목은 NaN"""
+    tail = panel.iloc[-window:]
+    return tail.mean().where(tail.count() >= window)
+
+def technical_signals(panel):
+    """종가 패널 -> 종목별 최신 지표 (이격도·52주 고점/저점 대비·연율 변동성은 모두 %)"""
+    if panel.empty: return pd.DataFrame(columns=SIGNAL_COLUMNS, dtype='float64')
+    # 거래정지 등으로 마지막 날 값이 없는 종목은 직전 종가 사용
+    close = panel.ffill().iloc[-1]
+    ma120, ma240 = moving_average(panel, 120), moving_average(panel, 240)
+    year = panel.iloc[-YEAR_DAYS:]
+    returns = np.log(year).diff()
+    return pd.DataFrame({
+        'MA120': ma120,
+        'MA240': ma240,
+        'MA120이격': (close / ma120 - 1) * 100,
+        'MA240이격': (close / ma240 - 1) * 100,
+        '고점대비': (close / year.max() - 1) * 100,
+        '저점대비': (close / year.min() - 1) * 100,
+        '변동성': returns.std() * np.sqrt(YEAR_DAYS) * 100,
+    })
+
+def signal_mask(df, ma_side=MA_SIDES[0], min_drawdown=0.0, max_volatility=np.inf):
+    """사이드바 기술적 조건. min_drawdown 은 52주 고점 대비 최소 하락폭(%), 조건을 안 쓰면 지표가 없어도 통과"""
+    mask = np.ones(len(df), dtype=bool)
+    if ma_side == MA_SIDES[1]: mask &= (df['MA240이격'] < 0).to_numpy()
+    elif ma_side == MA_SIDES[2]: mask &= (df['MA240이격'] >= 0).to_numpy()
+    if min_drawdown > 0: mask &= (df['고점대비'] <= -min_drawdown).to_numpy()
+    if np.isfinite(max_volatility): mask &= (df['변동성'] <= max_volatility).to_numpy()
+    return mask
@@ -0,0 +1,334 @@
+import os
+import glob
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone, time as dtime
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+
+# ---------------------------------------------------------
+# [설정] 저장 위치 및 장 운영 시간
+# ---------------------------------------------------------
+DATA_DIR = os.environ.get(
+    'STOCK_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+)
+
+KST = timezone(timedelta(hours=9))   # 한국은 서머타임이 없으므로 고정 오프셋
+MARKET_OPEN = dtime(9, 0)
+MARKET_CLOSE = dtime(15, 30)
+
+STAMP_FORMAT = "%Y%m%d-%H%M%S"
+
+def now_kst():
+    return datetime.now(KST).replace(tzinfo=None)
+
+def is_market_open(now=None):
+    """정규장(평일 09:00~15:30) 여부. 공휴일은 고려하지 않음"""
+    now = now or now_kst()
+    return now.weekday() < 5 and MARKET_OPEN <= now.time() < MARKET_CLOSE
+
+def last_market_close(now=None):
+    """now 이전의 가장 최근 장 마감 시각"""
+    now = now or now_kst()
+    day = now.date()
+    while True:
+        close = datetime.combine(day, MARKET_CLOSE)
+        if day.weekday() < 5 and close <= now:
+            return close
+        day -= timedelta(days=1)
+
+def trading_day(now=None):
+    """현재 시세가 속한 거래일 (장중이면 오늘, 아니면 마지막으로 마감한 날)"""
+    now = now or now_kst()
+    return now.date() if is_market_open(now) else last_market_close(now).date()
+
+try:
+    import fcntl
+except ImportError:   # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_WAIT = timedelta(minutes=2)   # 다른 워커의 스캔을 이보다 오래 기다리지는 않음 (스캔 한 번은 보통 몇 초)
+
+class FileLock:
+    """여러 워커 프로세스 사이의 잠금. 열어 둔 잠금 파일에 flock(Windows 는 msvcrt.locking)을 걸므로
+    워커가 스캔 도중 죽어도(재시작/배포) OS 가 바로 풀어 줌. 잠금 파일 자체는 지우지 않고 계속 재사용함"""
+
+    def __init__(self, path):
+        self.path = path
+        self.acquired = False
+        self.waited = False   # 다른 워커가 쥐고 있어서 기다렸는지 (그 워커가 방금 만든 결과를 다시 확인하는 데 씀)
+        self._fd = None
+
+    def _try(self):
+        try:
+            if fcntl: fcntl.flock(self._fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else: msvcrt.locking(self._fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def acquire(self, timeout=None, on_wait=None, poll_seconds=0.2):
+        """timeout 초 안에 얻으면 True (None 이면 계속 기다림, 0 이면 한 번만 시도).
+        기다리는 동안 poll_seconds 마다 on_wait(기다린 초) 를 호출 - Streamlit 에서는 이때 재실행 요청을 받아 중단할 수 있음"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT)
+        start = time.monotonic()
+        while not self._try():
+            waited_s = time.monotonic() - start
+            if timeout is not None and waited_s >= timeout:
+                os.close(self._fd)
+                self._fd = None
+                return False
+            self.waited = True
+            if on_wait: on_wait(waited_s)
+            time.sleep(poll_seconds)
+        self.acquired = True
+        return True
+
+    def release(self):
+        if self._fd is None: return
+        try:
+            if fcntl: fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else: msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+            self.acquired = False
+
+@contextmanager
+def file_lock(path, timeout=LOCK_WAIT.total_seconds(), on_wait=None):
+    """with 블록 동안 잠금을 쥠. timeout 안에 못 얻으면 잠금 없이 블록을 실행하므로 lock.acquired 를 확인할 것"""
+    lock = FileLock(path)
+    lock.acquire(timeout, on_wait)
+    try: yield lock
+    finally: lock.release()
+
+def atomic_write(path, write):
+    """임시 파일에 쓴 뒤 교체 - 다른 워커가 반쯤 쓰인 파일을 읽지 않도록"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path): os.remove(tmp_path)
+        raise
+
+# ---------------------------------------------------------
+# [스냅샷] 시장 전체 스캔 결과 (Arrow IPC, 메모리 맵으로 읽기)
+# ---------------------------------------------------------
+class SnapshotStore:
+    """시장별 스캔 결과를 data/snapshots/<market>/<시각>.arrow 로 저장.
+    여러 Streamlit 워커/재시작 사이에서 같은 파일을 공유함"""
+
+    def __init__(self, root=None, max_age_minutes=60):
+        self.root = root or os.path.join(DATA_DIR, 'snapshots')
+        self.max_age = timedelta(minutes=max_age_minutes)
+
+    def _dir(self, market):
+        return os.path.join(self.root, market)
+
+    def lock_path(self, market):
+        """시장 스캔 잠금 - 버튼과 백그라운드 갱신이 같은 스캔을 동시에 돌리지 않도록"""
+        return os.path.join(self._dir(market), 'scan.lock')
+
+    def snapshots(self, market):
+        """(찍은 시각, 경로) 목록, 오래된 순"""
+        items = []
+        for path in glob.glob(os.path.join(self._dir(market), '*.arrow')):
+            try:
+                taken_at = datetime.strptime(os.path.basename(path)[:-6], STAMP_FORMAT)
+            except ValueError:
+                continue
+            items.append((taken_at, path))
+        return sorted(items)
+
+    def latest(self, market):
+        items = self.snapshots(market)
+        return items[-1] if items else (None, None)
+
+    def is_fresh(self, taken_at, now=None):
+        """N분 이내에 찍었거나, 마지막 장 마감 이후(장이 닫힌 동안)에 찍은 스냅샷이면 재사용"""
+        if taken_at is None: return False
+        now = now or now_kst()
+        if now - taken_at <= self.max_age: return True
+        return not is_market_open(now) and taken_at >= last_market_close(now)
+
+    def save(self, market, df, taken_at=None):
+        taken_at = taken_at or now_kst()
+        path = os.path.join(self._dir(market), taken_at.strftime(STAMP_FORMAT) + '.arrow')
+        table = pa.Table.from_pandas(df, preserve_index=True)
+
+        def write(f):
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+        atomic_write(path, write)
+
+        # 같은 날 찍은 이전 스냅샷은 정리 (하루에 마지막 한 장만 보관)
+        for old_at, old_path in self.snapshots(market):
+            if old_at.date() == taken_at.date() and old_path != path:
+                try: os.remove(old_path)
+                except OSError: pass   # 다른 워커가 읽는 중이면 다음 기회에
+        return path
+
+    def read(self, path):
+        with pa.memory_map(path, 'r') as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+
+    def read_history(self, market, columns, start=None):
+        """일별 스냅샷의 일부 컬럼을 Date 컬럼과 함께 한 DataFrame 으로 (백테스트용).
+        파일마다 pandas 로 바꾸지 않고 Arrow 표를 이어 붙인 뒤 한 번만 변환"""
+        tables = []
+        for taken_at, path in self.snapshots(market):
+            if start is not None and taken_at < start: continue
+            try:
+                with pa.memory_map(path, 'r') as source:
+                    table = pa.ipc.open_file(source).read_all()
+            except (OSError, pa.ArrowInvalid):
+                continue
+            index = [c for c in table.schema.pandas_metadata.get('index_columns', []) if isinstance(c, str)]
+            # pandas 메타데이터를 지워 종목코드가 인덱스가 아닌 일반 컬럼으로 남도록 함
+            table = table.select(index + [c for c in columns if c in table.column_names]).replace_schema_metadata(None)
+            # 종목명 등 category 로 저장된 컬럼은 일반 문자열로 (스냅샷마다 사전이 달라 그대로는 이어 붙일 수 없음)
+            for i, field in enumerate(table.schema):
+                if pa.types.is_dictionary(field.type):
+                    table = table.set_column(i, field.name, table.column(i).cast(field.type.value_type))
+            tables.append(table.append_column('Date', pa.repeat(pa.scalar(taken_at.date(), pa.date32()), table.num_rows)))
+        if not tables: return pd.DataFrame()
+        # 나중에 생긴 컬럼(부채비율 등)이 없는 예전 스냅샷은 null 로 채우고, float64/float32 가 섞이면 넓은 쪽으로
+        df = pa.concat_tables(tables, promote_options='permissive').to_pandas()
+        df['Date'] = pd.to_datetime(df['Date'])
+        return df
+
+    def load_previous(self, market, taken_at):
+        """taken_at 보다 앞선 날의 마지막 스냅샷 (DataFrame, 찍은 시각). 없으면 (None, None).
+        같은 날 스냅샷은 한 장만 남으므로 '지난 스캔'은 전 거래일 스냅샷이 됨"""
+        earlier = [item for item in self.snapshots(market) if item[0].date() < taken_at.date()]
+        if not earlier: return None, None
+        prev_at, path = earlier[-1]
+        try:
+            return self.read(path), prev_at
+        except (OSError, pa.ArrowInvalid):
+            return None, None
+
+    def load(self, market, fresh_only=True, now=None):
+        """가장 최근 스냅샷 (DataFrame, 찍은 시각). 없거나 오래됐으면 (None, None)"""
+        taken_at, path = self.latest(market)
+        if path is None: return None, None
+        if fresh_only and not self.is_fresh(taken_at, now): return None, None
+        try:
+            return self.read(path), taken_at
+        except (OSError, pa.ArrowInvalid):
+            return None, None
+
+# ---------------------------------------------------------
+# [재무] 종목별 재무비율 캐시 (결산 기간 기준 만료)
+# ---------------------------------------------------------
+REPORT_DELAY = timedelta(days=45)   # 분기 종료 후 실적 공시까지 걸리는 기간
+MIN_TTL = timedelta(days=1)
+MAX_TTL = timedelta(days=92)
+
+def next_report_due(period, fetched_at):
+    """'2024.06' 같은 결산 기간 다음 분기 실적이 나올 것으로 예상되는 시각"""
+    try:
+        year, month = (int(x) for x in period.split('.')[:2])
+        month += 3
+        if month > 12: year, month = year + 1, month - 12
+        # 다음 분기 말일 + 공시 기간
+        quarter_end = datetime(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+        due = quarter_end + REPORT_DELAY
+    except (AttributeError, ValueError):
+        due = fetched_at
+    return min(max(due, fetched_at + MIN_TTL), fetched_at + MAX_TTL)
+
+class FundamentalsCache:
+    """종목코드 -> (결산 기간, 부채비율 등) 을 data/fundamentals.arrow 한 파일로 보관.
+    다음 분기 실적이 나올 때까지는 같은 값을 재사용"""
+
+    RATIOS = ['부채비율', '유동비율', '당좌비율', '유보율']
+    COLUMNS = ['period'] + RATIOS + ['fetched_at', 'expires_at']
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(DATA_DIR, 'fundamentals.arrow')
+
+    def read(self):
+        empty = pd.DataFrame(columns=self.COLUMNS, index=pd.Index([], name='Ticker'))
+        if not os.path.exists(self.path): return empty
+        try:
+            with pa.memory_map(self.path, 'r') as source:
+                return pa.ipc.open_file(source).read_all().to_pandas()
+        except (OSError, pa.ArrowInvalid):
+            return empty
+
+    def get_many(self, tickers, now=None):
+        """아직 만료되지 않은 종목만 반환"""
+        now = now or now_kst()
+        df = self.read()
+        df = df[df.index.isin(list(tickers))]
+        return df[df['expires_at'] > now]
+
+    def put_many(self, records, now=None):
+        """records: {종목코드: {'period': ..., '부채비율': ..., ...}}"""
+        if not records: return
+        now = now or now_kst()
+        rows = []
+        for ticker, rec in records.items():
+            row = {'Ticker': ticker, 'period': rec.get('period')}
+            for name in self.RATIOS:
+                row[name] = float(rec.get(name, float('nan')))
+            row['fetched_at'] = now
+            row['expires_at'] = next_report_due(rec.get('period'), now)
+            rows.append(row)
+        new = pd.DataFrame(rows).set_index('Ticker')
+        # 읽기-합치기-교체 사이에 다른 워커가 쓴 종목이 사라지지 않도록 잠금 (못 얻으면 TimeoutError, 호출한 쪽에서 OSError 로 처리)
+        with file_lock(self.path + '.lock') as lock:
+            if not lock.acquired: raise TimeoutError(f"잠금을 얻지 못했습니다: {self.path}.lock")
+            old = self.read()
+            merged = pd.concat([old[~old.index.isin(new.index)], new])[self.COLUMNS]
+            merged['period'] = merged['period'].astype(object)
+            table = pa.Table.from_pandas(merged, preserve_index=True)
+
+            def write(f):
+                with pa.ipc.new_file(f, table.schema) as writer:
+                    writer.write_table(table)
+            atomic_write(self.path, write)
+
+# ---------------------------------------------------------
+# [시세] 종목별 일별 종가 이력 (새로 생긴 날짜만 추가로 받아 붙임)
+# ---------------------------------------------------------
+class PriceStore:
+    """종목별 일별 종가를 data/prices/<종목코드>.arrow 로 보관"""
+
+    def __init__(self, root=None):
+        self.root = root or os.path.join(DATA_DIR, 'prices')
+
+    def path(self, ticker):
+        return os.path.join(self.root, f"{ticker}.arrow")
+
+    def load(self, ticker):
+        """(Date 인덱스의 Close DataFrame, 저장 시각, 이력 시작일). 없으면 (빈 DataFrame, None, None).
+        이력 시작일은 그 날짜부터는 빠짐없이 받아 두었다는 뜻 (상장일이 더 늦으면 상장일부터)"""
+        path = self.path(ticker)
+        try:
+            saved_at = datetime.fromtimestamp(os.path.getmtime(path), KST).replace(tzinfo=None)
+            with pa.memory_map(path, 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+            since = (table.schema.metadata or {}).get(b'since')
+            return table.to_pandas(), saved_at, pd.Timestamp(since.decode()) if since else None
+        except (OSError, pa.ArrowInvalid):
+            return pd.DataFrame(), None, None
+
+    def save(self, ticker, df, since):
+        table = pa.Table.from_pandas(df, preserve_index=True)
+        table = table.replace_schema_metadata({**table.schema.metadata, b'since': str(since.date()).encode()})
+
+        def write(f):
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+        atomic_write(self.path(ticker), write)
@@ -0,0 +1,101 @@
+import os
+import threading
+from datetime import timedelta
+
+import pandas as pd
+
+from market_data import SNAPSHOT_KEY, get_debt_ratios, load_price_panel, prescreen, scan_naver_market
+from metrics import metrics
+from signals import SIGNAL_DAYS
+from store import DATA_DIR, FileLock, file_lock, is_market_open, last_market_close, now_kst
+
+# ---------------------------------------------------------
+# [백그라운드] 장 운영 시간에 맞춰 시장 스냅샷/재무 캐시를 미리 채움
+# ---------------------------------------------------------
+REFRESH_MINUTES = 20     # 장중 재스캔 간격 (스냅샷 유효시간보다 짧게)
+CLOSE_SETTLE = timedelta(minutes=10)   # 장 마감 후 종가가 확정될 때까지 기다리는 시간
+
+class CacheWarmer:
+    """버튼과 상관없이 별도 스레드에서 시장 스캔 + 재무비율 선수집.
+    여러 워커 프로세스가 각자 돌더라도 잠금 파일로 한 번에 하나만 갱신하고,
+    시장 스캔은 버튼과 같은 스캔 잠금(SnapshotStore.lock_path)을 잡아 동시에 두 번 돌지 않게 함"""
+
+    def __init__(self, snapshot_store, fundamentals_cache, price_store=None, market=SNAPSHOT_KEY,
+                 refresh_minutes=REFRESH_MINUTES, poll_seconds=60):
+        self.snapshot_store = snapshot_store
+        self.fundamentals_cache = fundamentals_cache
+        self.price_store = price_store
+        self.market = market
+        self.refresh_interval = timedelta(minutes=refresh_minutes)
+        self.poll_seconds = poll_seconds
+        self.lock_path = os.path.join(DATA_DIR, f"warmer-{market}.lock")
+        self.last_refresh = None
+        self.last_error = None
+        self.running = False
+        self._stop = threading.Event()
+        self._thread = None
+
+    def is_due(self, now=None):
+        """장중에는 refresh_minutes 마다, 장 마감 후에는 종가 확정 뒤 한 번"""
+        now = now or now_kst()
+        taken_at, _ = self.snapshot_store.latest(self.market)
+        if taken_at is None: return True
+        if is_market_open(now): return now - taken_at >= self.refresh_interval
+        settled = last_market_close(now) + CLOSE_SETTLE
+        return now >= settled and taken_at < settled
+
+    def refresh(self):
+        """시장 스캔 후 고정 조건을 통과한 종목의 재무비율을 미리 받아 둠"""
+        refresh_lock = FileLock(self.lock_path)
+        if not refresh_lock.acquire(timeout=0): return False
+        self.running = True
+        try:
+            with file_lock(self.snapshot_store.lock_path(self.market)) as scan_lock:
+                # 스캔 잠금을 끝내 못 얻었거나, 기다리는 동안 버튼 쪽 스캔이 새 스냅샷을 남겼으면 이번 주기는 건너뜀
+                if not scan_lock.acquired or (scan_lock.waited and not self.is_due()): return False
+                failed = {}
+                with metrics.timer('warmer', 'scan'):
+                    df_all = scan_naver_market(failed=failed)
+                if df_all.empty: raise RuntimeError("시장 데이터를 가져오지 못했습니다")
+                # 일부 페이지가 빠진 스냅샷을 유효한 것처럼 저장하지 않음 (다음 주기에 다시 스캔)
+                if failed: raise RuntimeError(f"받지 못한 페이지가 있습니다: {failed}")
+                taken_at = now_kst()
+                self.snapshot_store.save(self.market, df_all, taken_at)
+            # 캐시에 없는 종목만 요청됨
+            with metrics.timer('warmer', 'fundamentals'):
+                debt_ratios = get_debt_ratios(prescreen(df_all).index, self.fundamentals_cache)
+            # 백테스트에서 그날의 부채비율로 다시 거를 수 있도록 스냅샷에도 남김 (같은 파일을 덮어씀)
+            df_all['부채비율'] = pd.Series(debt_ratios, dtype='float64').reindex(df_all.index)
+            self.snapshot_store.save(self.market, df_all, taken_at)
+            # 장 마감 후 한 번, 기술적 지표에 쓸 일별 시세를 미리 받아 둠 (버튼을 누르면 디스크에서 바로 계산).
+            # 처음에는 종목마다 수십 페이지라 오래 걸리므로 장중 스캔과 요청 한도를 나눠 쓰지 않도록 장 마감 후에만
+            if self.price_store is not None and not is_market_open():
+                with metrics.timer('warmer', 'prices'):
+                    load_price_panel(prescreen(df_all).index, self.price_store, SIGNAL_DAYS)
+            self.last_refresh = now_kst()
+            self.last_error = None
+            return True
+        finally:
+            self.running = False
+            refresh_lock.release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.is_due(): self.refresh()
+            except Exception as e:
+                metrics.swallowed('warmer', e)
+                self.last_error = f"{type(e).__name__}: {e}"
+            # 외부 수집기가 긁어 갈 수 있도록 주기적으로 지표 파일 갱신
+            try: metrics.write_files(DATA_DIR)
+            except OSError as e: metrics.swallowed('warmer', e)
+            self._stop.wait(self.poll_seconds)
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"cache-warmer-{self.market}", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()